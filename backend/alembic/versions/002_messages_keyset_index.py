@@ -0,0 +1,42 @@
+"""messages (conversation_id, id desc) keyset index
+
+Revision ID: 002_messages_keyset_index
+Revises: 001_initial
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "002_messages_keyset_index"
+down_revision = "001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Built concurrently so large message tables stay writable during the migration.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_messages_conversation_id_id",
+            "messages",
+            ["conversation_id", sa.text("id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        # The composite index covers conversation_id lookups on its own.
+        op.drop_index("ix_messages_conversation_id", table_name="messages", postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_messages_conversation_id",
+            "messages",
+            ["conversation_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index("ix_messages_conversation_id_id", table_name="messages", postgresql_concurrently=True)
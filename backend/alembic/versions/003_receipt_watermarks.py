@@ -0,0 +1,45 @@
+"""per-member receipt watermarks
+
+Revision ID: 003_receipt_watermarks
+Revises: 002_messages_keyset_index
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "003_receipt_watermarks"
+down_revision = "002_messages_keyset_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("conversation_members", sa.Column("last_delivered_message_id", sa.Integer(), nullable=True))
+    op.add_column("conversation_members", sa.Column("last_read_message_id", sa.Integer(), nullable=True))
+
+    # Backfill from per-message receipts; a read receipt implies delivery.
+    op.execute(
+        """
+        UPDATE conversation_members AS cm
+        SET last_delivered_message_id = r.max_any,
+            last_read_message_id = r.max_read
+        FROM (
+            SELECT m.conversation_id,
+                   mr.user_id,
+                   max(mr.message_id) AS max_any,
+                   max(mr.message_id) FILTER (WHERE mr.status = 'read') AS max_read
+            FROM message_receipts AS mr
+            JOIN messages AS m ON m.id = mr.message_id
+            GROUP BY m.conversation_id, mr.user_id
+        ) AS r
+        WHERE cm.conversation_id = r.conversation_id AND cm.user_id = r.user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("conversation_members", "last_read_message_id")
+    op.drop_column("conversation_members", "last_delivered_message_id")
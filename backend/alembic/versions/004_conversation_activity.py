@@ -0,0 +1,53 @@
+"""conversations last_message_id / last_activity_at
+
+Revision ID: 004_conversation_activity
+Revises: 003_receipt_watermarks
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "004_conversation_activity"
+down_revision = "003_receipt_watermarks"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("conversations", sa.Column("last_message_id", sa.Integer(), nullable=True))
+    op.add_column(
+        "conversations",
+        sa.Column("last_activity_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+
+    # Backfill from the newest message; conversations without messages keep their creation time.
+    op.execute(
+        """
+        UPDATE conversations AS c
+        SET last_message_id = m.id,
+            last_activity_at = m.created_at
+        FROM (
+            SELECT DISTINCT ON (conversation_id) conversation_id, id, created_at
+            FROM messages
+            ORDER BY conversation_id, id DESC
+        ) AS m
+        WHERE c.id = m.conversation_id
+        """
+    )
+    op.execute("UPDATE conversations SET last_activity_at = created_at WHERE last_message_id IS NULL")
+
+    op.create_index(
+        "ix_conversations_last_activity_at_id",
+        "conversations",
+        [sa.text("last_activity_at DESC"), sa.text("id DESC")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_conversations_last_activity_at_id", table_name="conversations")
+    op.drop_column("conversations", "last_activity_at")
+    op.drop_column("conversations", "last_message_id")
@@ -0,0 +1,53 @@
+"""unique (low, high) user pair for direct conversations
+
+Revision ID: 005_direct_pairs
+Revises: 004_conversation_activity
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "005_direct_pairs"
+down_revision = "004_conversation_activity"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("conversations", sa.Column("direct_user_low_id", sa.Integer(), nullable=True))
+    op.add_column("conversations", sa.Column("direct_user_high_id", sa.Integer(), nullable=True))
+
+    # Earlier races may have created duplicate direct chats; the oldest one keeps the pair.
+    op.execute(
+        """
+        UPDATE conversations AS c
+        SET direct_user_low_id = p.low_id,
+            direct_user_high_id = p.high_id
+        FROM (
+            SELECT DISTINCT ON (low_id, high_id) conversation_id, low_id, high_id
+            FROM (
+                SELECT cm.conversation_id, min(cm.user_id) AS low_id, max(cm.user_id) AS high_id
+                FROM conversation_members AS cm
+                JOIN conversations AS c2 ON c2.id = cm.conversation_id
+                WHERE c2.type = 'direct'
+                GROUP BY cm.conversation_id
+                HAVING count(*) = 2
+            ) AS pairs
+            ORDER BY low_id, high_id, conversation_id
+        ) AS p
+        WHERE c.id = p.conversation_id
+        """
+    )
+
+    op.create_unique_constraint(
+        "uq_conversations_direct_pair", "conversations", ["direct_user_low_id", "direct_user_high_id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_conversations_direct_pair", "conversations", type_="unique")
+    op.drop_column("conversations", "direct_user_high_id")
+    op.drop_column("conversations", "direct_user_low_id")
@@ -0,0 +1,32 @@
+"""messages full-text search: generated tsvector + GIN index
+
+Revision ID: 006_messages_fts
+Revises: 005_direct_pairs
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+
+
+revision = "006_messages_fts"
+down_revision = "005_direct_pairs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Not mapped on the model; queried by name from app/api/v1/search.py. The text search
+    # configuration here must match SEARCH_TS_CONFIG there.
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN body_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english', coalesce(body, ''))) STORED"
+    )
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY ix_messages_body_tsv ON messages USING gin (body_tsv)")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_messages_body_tsv")
+    op.execute("ALTER TABLE messages DROP COLUMN body_tsv")
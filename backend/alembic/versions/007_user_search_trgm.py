@@ -0,0 +1,34 @@
+"""pg_trgm indexes for user search
+
+Revision ID: 007_user_search_trgm
+Revises: 006_messages_fts
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+
+
+revision = "007_user_search_trgm"
+down_revision = "006_messages_fts"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Expression indexes on lower(); search_users matches on exactly these expressions.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY ix_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY ix_profiles_display_name_trgm "
+            "ON profiles USING gin (lower(display_name) gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_profiles_display_name_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_email_trgm")
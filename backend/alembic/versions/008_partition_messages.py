@@ -0,0 +1,115 @@
+"""range-partition messages by id
+
+Revision ID: 008_partition_messages
+Revises: 007_user_search_trgm
+Create Date: 2026-10-18
+
+The existing table becomes the first partition as-is (no rows are copied); its indexes
+are attached to the new parent's. Partitioning by id rather than created_at keeps
+`id` a valid primary key on its own, so attachments and receipts keep their foreign
+keys. Later partitions are created and archived by `python -m app.db.partitions`.
+
+"""
+
+from alembic import op
+
+
+revision = "008_partition_messages"
+down_revision = "007_user_search_trgm"
+branch_labels = None
+depends_on = None
+
+# Width of each partition in message ids; matches the MESSAGE_PARTITION_SIZE default.
+PARTITION_SIZE = 5_000_000
+BOUND_CHECK = "messages_p0000_id_bound"
+
+
+def upgrade() -> None:
+    # The old table covers everything up to the next partition boundary. Proving that with
+    # a validated CHECK first, in its own transactions (the validation scan only takes a
+    # SHARE UPDATE EXCLUSIVE lock), lets ATTACH below skip its scan under ACCESS EXCLUSIVE.
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"""
+            DO $$
+            DECLARE
+                size bigint := {PARTITION_SIZE};
+                bound bigint;
+            BEGIN
+                SELECT (coalesce(max(id), 0) / size + 1) * size INTO bound FROM messages;
+                EXECUTE format('ALTER TABLE messages ADD CONSTRAINT {BOUND_CHECK} CHECK (id < %s) NOT VALID', bound);
+            END $$
+            """
+        )
+        op.execute(f"ALTER TABLE messages VALIDATE CONSTRAINT {BOUND_CHECK}")
+
+    op.execute("ALTER TABLE messages RENAME TO messages_p0000")
+    # Free the canonical names for the parent; on attach its constraints and indexes
+    # adopt these existing ones instead of being built again.
+    for name in ("pkey", "conversation_id_fkey", "sender_id_fkey"):
+        op.execute(f"ALTER TABLE messages_p0000 RENAME CONSTRAINT messages_{name} TO messages_p0000_{name}")
+    op.execute("ALTER INDEX ix_messages_conversation_id_id RENAME TO messages_p0000_conversation_id_id_idx")
+    op.execute("ALTER INDEX ix_messages_sender_id RENAME TO messages_p0000_sender_id_idx")
+    op.execute("ALTER INDEX ix_messages_body_tsv RENAME TO messages_p0000_body_tsv_idx")
+
+    # Re-pointed at the partitioned parent below.
+    op.execute("ALTER TABLE attachments DROP CONSTRAINT attachments_message_id_fkey")
+    op.execute("ALTER TABLE message_receipts DROP CONSTRAINT message_receipts_message_id_fkey")
+
+    op.execute(
+        """
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            conversation_id INTEGER NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+            sender_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            body TEXT NOT NULL DEFAULT '',
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            edited_at TIMESTAMP WITH TIME ZONE,
+            deleted_at TIMESTAMP WITH TIME ZONE,
+            body_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', coalesce(body, ''))) STORED,
+            CONSTRAINT messages_pkey PRIMARY KEY (id)
+        ) PARTITION BY RANGE (id)
+        """
+    )
+    # So archiving (dropping) the old table never takes the id sequence with it.
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+
+    # The partition after the old table is created empty so inserts never run out of room
+    # before maintenance runs. The CHECK keeps max(id) below the bound it was made with.
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            size bigint := {PARTITION_SIZE};
+            bound bigint;
+        BEGIN
+            SELECT (coalesce(max(id), 0) / size + 1) * size INTO bound FROM messages_p0000;
+            EXECUTE format('ALTER TABLE messages ATTACH PARTITION messages_p0000 FOR VALUES FROM (MINVALUE) TO (%s)', bound);
+            ALTER TABLE messages_p0000 DROP CONSTRAINT {BOUND_CHECK};
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%s) TO (%s)',
+                'messages_p' || lpad((bound / size)::text, 4, '0'), bound, bound + size
+            );
+        END $$
+        """
+    )
+
+    op.execute("CREATE INDEX ix_messages_conversation_id_id ON messages (conversation_id, id DESC)")
+    op.execute("CREATE INDEX ix_messages_sender_id ON messages (sender_id)")
+    op.execute("CREATE INDEX ix_messages_body_tsv ON messages USING gin (body_tsv)")
+
+    for table in ("attachments", "message_receipts"):
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_message_id_fkey "
+            "FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE NOT VALID"
+        )
+    # After the swap has committed, so the scans don't run under its exclusive locks.
+    with op.get_context().autocommit_block():
+        for table in ("attachments", "message_receipts"):
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_message_id_fkey")
+
+
+def downgrade() -> None:
+    # Folding partitions (some possibly archived or exported) back into one heap is a
+    # data migration, not a schema change.
+    raise NotImplementedError("008_partition_messages cannot be downgraded automatically")
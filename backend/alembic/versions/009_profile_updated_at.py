@@ -0,0 +1,27 @@
+"""profiles.updated_at (contacts ETag version)
+
+Revision ID: 009_profile_updated_at
+Revises: 008_partition_messages
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "009_profile_updated_at"
+down_revision = "008_partition_messages"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "profiles",
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("profiles", "updated_at")
@@ -0,0 +1,27 @@
+"""conversations.members_updated_at (conversation list ETag version)
+
+Revision ID: 010_members_updated_at
+Revises: 009_profile_updated_at
+Create Date: 2026-10-18
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "010_members_updated_at"
+down_revision = "009_profile_updated_at"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "conversations",
+        sa.Column("members_updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("conversations", "members_updated_at")
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+from anyio import from_thread
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
@@ -11,12 +14,13 @@ from app.core.security import (
     hash_password,
     verify_password,
 )
-from app.db.database import get_db
+from app.db.database import get_async_db, get_db
 from app.models.profile import Profile
 from app.models.user import User
 from app.schemas.auth import ForgotPasswordRequest, ResetPasswordRequest, SignupRequest, TokenResponse
 from app.services.email_service import send_email
 from app.services.google_oauth_service import GOOGLE_AUTH_BASE, GOOGLE_TOKEN_URL, GOOGLE_USERINFO_URL, get_client, is_configured
+from app.services.principals import invalidate_principal
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -82,6 +86,7 @@ def reset_password(payload: ResetPasswordRequest, db: Session = Depends(get_db))
     user.password_hash = hash_password(payload.new_password)
     db.add(user)
     db.commit()
+    from_thread.run(invalidate_principal, user.id)
     return {"ok": True}
 
 
@@ -104,7 +109,7 @@ def google_auth_url() -> dict:
 
 
 @router.get("/google/callback", response_model=TokenResponse)
-async def google_callback(code: str, db: Session = Depends(get_db)) -> TokenResponse:
+async def google_callback(code: str, db: AsyncSession = Depends(get_async_db)) -> TokenResponse:
     if not is_configured():
         raise HTTPException(status_code=400, detail="Google OAuth not configured")
 
@@ -119,18 +124,17 @@ async def google_callback(code: str, db: Session = Depends(get_db)) -> TokenResp
     if not email or not sub:
         raise HTTPException(status_code=400, detail="Invalid Google userinfo")
 
-    user = db.query(User).filter((User.google_sub == sub) | (User.email == email)).first()
+    user = await db.scalar(select(User).where((User.google_sub == sub) | (User.email == email)))
     if not user:
         user = User(email=email, google_sub=sub)
         user.profile = Profile(display_name=info.get("name") or "")
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
     else:
         if not user.google_sub:
             user.google_sub = sub
             db.add(user)
-            db.commit()
+            await db.commit()
 
     return TokenResponse(access_token=create_access_token(str(user.id)))
 
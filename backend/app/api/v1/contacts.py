@@ -1,15 +1,20 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel, EmailStr
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
-from app.core.deps import get_current_user
+from app.core.deps import get_current_principal, get_read_db
+from app.core.etag import etag_headers, make_etag, not_modified
+from app.core.responses import FastJSONResponse
 from app.db.database import get_db
 from app.models.block import Block
 from app.models.contact import Contact
+from app.models.profile import Profile
 from app.models.user import User
 from app.schemas.chat import ContactOut
+from app.services.principals import Principal
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
@@ -19,30 +24,49 @@ class ContactAddRequest(BaseModel):
 
 
 @router.get("", response_model=list[ContactOut])
-def list_contacts(db: Session = Depends(get_db), current: User = Depends(get_current_user)) -> list[ContactOut]:
-    contacts = (
-        db.query(Contact)
-        .filter(Contact.owner_user_id == current.id)
+def list_contacts(
+    request: Request,
+    db: Session = Depends(get_read_db),
+    current: Principal = Depends(get_current_principal),
+) -> Response:
+    # Contacts are only added or deleted, so (count, max id) versions the set; profile edits
+    # bump updated_at.
+    version = db.execute(
+        select(func.count(Contact.id), func.max(Contact.id), func.max(Profile.updated_at))
+        .select_from(Contact)
+        .outerjoin(Profile, Profile.user_id == Contact.contact_user_id)
+        .where(Contact.owner_user_id == current.id)
+    ).one()
+    etag = make_etag("contacts", current.id, *version)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    # Plain columns in one query: no per-contact lazy loads of user and profile.
+    rows = db.execute(
+        select(Contact.id, User.id, User.email, Profile.user_id, Profile.display_name, Profile.avatar_url)
+        .join(User, User.id == Contact.contact_user_id)
+        .outerjoin(Profile, Profile.user_id == User.id)
+        .where(Contact.owner_user_id == current.id)
         .order_by(Contact.created_at.desc())
-        .all()
+    ).all()
+    return FastJSONResponse(
+        [
+            {
+                "id": cid,
+                "user_id": uid,
+                "email": email,
+                "display_name": display_name if has_profile else email,
+                "avatar_url": avatar_url if has_profile else None,
+            }
+            for cid, uid, email, has_profile, display_name, avatar_url in rows
+        ],
+        headers=etag_headers(etag),
     )
-    out: list[ContactOut] = []
-    for c in contacts:
-        u = c.contact
-        out.append(
-            ContactOut(
-                id=c.id,
-                user_id=u.id,
-                email=u.email,
-                display_name=(u.profile.display_name if u.profile else u.email),
-                avatar_url=(u.profile.avatar_url if u.profile else None),
-            )
-        )
-    return out
 
 
 @router.post("", response_model=ContactOut)
-def add_contact(payload: ContactAddRequest, db: Session = Depends(get_db), current: User = Depends(get_current_user)) -> ContactOut:
+def add_contact(payload: ContactAddRequest, db: Session = Depends(get_db), current: Principal = Depends(get_current_principal)) -> ContactOut:
     user = db.query(User).filter(User.email == payload.email.lower()).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -83,7 +107,7 @@ def add_contact(payload: ContactAddRequest, db: Session = Depends(get_db), curre
 
 
 @router.delete("/{contact_id}")
-def delete_contact(contact_id: int, db: Session = Depends(get_db), current: User = Depends(get_current_user)) -> dict:
+def delete_contact(contact_id: int, db: Session = Depends(get_db), current: Principal = Depends(get_current_principal)) -> dict:
     c = db.query(Contact).filter(Contact.id == contact_id, Contact.owner_user_id == current.id).first()
     if not c:
         raise HTTPException(status_code=404, detail="Not found")
@@ -93,7 +117,7 @@ def delete_contact(contact_id: int, db: Session = Depends(get_db), current: User
 
 
 @router.post("/{user_id}/block")
-def block_user(user_id: int, db: Session = Depends(get_db), current: User = Depends(get_current_user)) -> dict:
+def block_user(user_id: int, db: Session = Depends(get_db), current: Principal = Depends(get_current_principal)) -> dict:
     if user_id == current.id:
         raise HTTPException(status_code=400, detail="Cannot block yourself")
     existing = db.query(Block).filter(Block.blocker_user_id == current.id, Block.blocked_user_id == user_id).first()
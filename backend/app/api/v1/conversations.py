@@ -1,40 +1,206 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func
+from datetime import datetime
+
+from anyio import from_thread
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.deps import get_current_user
+from app.core.deps import get_current_principal, get_read_async_db, get_read_db
+from app.core.etag import etag_headers, make_etag, not_modified
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.responses import FastJSONResponse
 from app.db.database import get_db
 from app.models.conversation import Conversation
 from app.models.conversation_member import ConversationMember
-from app.models.user import User
-from app.schemas.chat import ConversationCreate, ConversationOut
+from app.models.message import Message
+from app.schemas.chat import ConversationCreate, ConversationOut, InboxPage
+from app.services.membership import invalidate_members
+from app.services.principals import Principal
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
 
+UNREAD_COUNT_CAP = 100
+PREVIEW_LENGTH = 140
+
+
+def _member_ids_by_conversation(rows) -> dict[int, list[int]]:
+    out: dict[int, list[int]] = {}
+    for conversation_id, user_id in rows:
+        out.setdefault(conversation_id, []).append(user_id)
+    return out
+
+
+def _conversations_version(user_id: int):
+    """Version of the caller's conversation list, from one row per conversation they are in.
+
+    The caller's member rows only come and go (ids increase), so their (count, max id)
+    changes when they join or leave; members_updated_at and message ids only grow, so their
+    maxima change when any of those member lists does, or on any send (which is also what
+    reorders the list).
+    """
+    return (
+        select(
+            func.count(ConversationMember.id),
+            func.max(ConversationMember.id),
+            func.max(Conversation.members_updated_at),
+            func.max(Conversation.last_message_id),
+        )
+        .join(Conversation, Conversation.id == ConversationMember.conversation_id)
+        .where(ConversationMember.user_id == user_id)
+    )
+
+
 @router.get("", response_model=list[ConversationOut])
-def list_conversations(db: Session = Depends(get_db), current: User = Depends(get_current_user)) -> list[ConversationOut]:
-    memberships = (
-        db.query(ConversationMember)
+def list_conversations(
+    request: Request,
+    db: Session = Depends(get_read_db),
+    current: Principal = Depends(get_current_principal),
+) -> Response:
+    version = db.execute(_conversations_version(current.id)).one()
+    etag = make_etag("conversations", current.id, *version)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    convs = (
+        db.query(Conversation)
+        .join(ConversationMember, ConversationMember.conversation_id == Conversation.id)
         .filter(ConversationMember.user_id == current.id)
-        .order_by(ConversationMember.joined_at.desc())
+        .order_by(Conversation.last_activity_at.desc(), Conversation.id.desc())
         .all()
     )
-    out: list[ConversationOut] = []
-    for m in memberships:
-        conv = m.conversation
-        member_ids = [mm.user_id for mm in conv.members]
-        out.append(ConversationOut(id=conv.id, type=conv.type, title=conv.title, member_user_ids=member_ids))
-    return out
+    members = _member_ids_by_conversation(
+        db.query(ConversationMember.conversation_id, ConversationMember.user_id).filter(
+            ConversationMember.conversation_id.in_([c.id for c in convs])
+        )
+    )
+    return FastJSONResponse(
+        [{"id": c.id, "type": c.type, "title": c.title, "member_user_ids": members.get(c.id, [])} for c in convs],
+        headers=etag_headers(etag),
+    )
+
+
+@router.get("/inbox", response_model=InboxPage)
+async def inbox(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    db: AsyncSession = Depends(get_read_async_db),
+    current: Principal = Depends(get_current_principal),
+) -> Response:
+    """Conversations by recent activity, with members, last-message preview and unread count.
+
+    Three queries per page whatever the number of conversations: the page itself (unread
+    counts as a capped correlated subquery against the read watermark), member ids, and
+    the last messages. Pages continue with a (last_activity_at, id) keyset cursor.
+    """
+    # Unread counts also depend on the caller's read watermarks, which only move forward.
+    read_sum = (
+        select(func.coalesce(func.sum(ConversationMember.last_read_message_id), 0))
+        .where(ConversationMember.user_id == current.id)
+        .scalar_subquery()
+    )
+    version = (await db.execute(_conversations_version(current.id).add_columns(read_sum))).one()
+    etag = make_etag("inbox", current.id, *version)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    unread = (
+        select(Message.id)
+        .where(
+            Message.conversation_id == Conversation.id,
+            Message.id > func.coalesce(ConversationMember.last_read_message_id, 0),
+            Message.sender_id != current.id,
+        )
+        .limit(UNREAD_COUNT_CAP)
+        .correlate(Conversation, ConversationMember)
+        .subquery()
+    )
+    q = (
+        select(Conversation, select(func.count()).select_from(unread).scalar_subquery())
+        .join(ConversationMember, ConversationMember.conversation_id == Conversation.id)
+        .where(ConversationMember.user_id == current.id)
+        .order_by(Conversation.last_activity_at.desc(), Conversation.id.desc())
+    )
+    if cursor:
+        c = decode_cursor(cursor)
+        try:
+            at, anchor = datetime.fromisoformat(c["t"]), int(c["id"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        q = q.where(
+            (Conversation.last_activity_at < at) | ((Conversation.last_activity_at == at) & (Conversation.id < anchor))
+        )
+    rows = (await db.execute(q.limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor({"t": last.last_activity_at.isoformat(), "id": last.id})
+    if not rows:
+        return FastJSONResponse({"items": [], "next_cursor": None}, headers=etag_headers(etag))
+
+    ids = [conv.id for conv, _ in rows]
+    members = _member_ids_by_conversation(
+        await db.execute(
+            select(ConversationMember.conversation_id, ConversationMember.user_id).where(
+                ConversationMember.conversation_id.in_(ids)
+            )
+        )
+    )
+    last_ids = [conv.last_message_id for conv, _ in rows if conv.last_message_id is not None]
+    last_messages = {}
+    if last_ids:
+        preview = await db.execute(
+            select(Message.id, Message.sender_id, func.substr(Message.body, 1, PREVIEW_LENGTH), Message.created_at).where(
+                Message.id.in_(last_ids)
+            )
+        )
+        last_messages = {
+            mid: {"id": mid, "sender_id": sender_id, "body": body or "", "created_at": created_at}
+            for mid, sender_id, body, created_at in preview
+        }
+
+    return FastJSONResponse(
+        {
+            "items": [
+                {
+                    "id": conv.id,
+                    "type": conv.type,
+                    "title": conv.title,
+                    "member_user_ids": members.get(conv.id, []),
+                    "last_message": last_messages.get(conv.last_message_id),
+                    "last_activity_at": conv.last_activity_at,
+                    "unread_count": unread_count,
+                }
+                for conv, unread_count in rows
+            ],
+            "next_cursor": next_cursor,
+        },
+        headers=etag_headers(etag),
+    )
+
+
+def _find_direct(db: Session, low_id: int, high_id: int) -> Conversation | None:
+    return (
+        db.query(Conversation)
+        .filter(Conversation.direct_user_low_id == low_id, Conversation.direct_user_high_id == high_id)
+        .first()
+    )
 
 
 @router.post("", response_model=ConversationOut)
 def create_conversation(
     payload: ConversationCreate,
     db: Session = Depends(get_db),
-    current: User = Depends(get_current_user),
+    current: Principal = Depends(get_current_principal),
 ) -> ConversationOut:
     member_ids = set(payload.member_user_ids)
     member_ids.add(current.id)
@@ -44,26 +210,26 @@ def create_conversation(
         if len(member_ids) != 2:
             raise HTTPException(status_code=400, detail="Direct conversation needs exactly 2 members")
 
-        # Find existing direct conversation with these two members
         a, b = sorted(member_ids)
-        existing = (
-            db.query(Conversation)
-            .filter(Conversation.type == "direct")
-            .join(Conversation.members)
-            .group_by(Conversation.id)
-            .having(func.count(ConversationMember.id) == 2)
-            .all()
-        )
-        for conv in existing:
-            mids = sorted([m.user_id for m in conv.members])
-            if mids == [a, b]:
-                return ConversationOut(
-                    id=conv.id, type=conv.type, title=conv.title, member_user_ids=[a, b]
-                )
+        existing = _find_direct(db, a, b)
+        if existing:
+            return ConversationOut(id=existing.id, type=existing.type, title=existing.title, member_user_ids=[a, b])
 
-    conv = Conversation(type=payload.type, title=payload.title if payload.type == "group" else None)
-    db.add(conv)
-    db.flush()
+        conv = Conversation(type="direct", direct_user_low_id=a, direct_user_high_id=b)
+        db.add(conv)
+        try:
+            db.flush()
+        except IntegrityError:
+            # Both users opened the chat at once; the other request created it first.
+            db.rollback()
+            existing = _find_direct(db, a, b)
+            if not existing:
+                raise
+            return ConversationOut(id=existing.id, type=existing.type, title=existing.title, member_user_ids=[a, b])
+    else:
+        conv = Conversation(type=payload.type, title=payload.title)
+        db.add(conv)
+        db.flush()
 
     # creator admin for group
     for uid in member_ids:
@@ -72,6 +238,7 @@ def create_conversation(
 
     db.commit()
     db.refresh(conv)
+    from_thread.run(invalidate_members, conv.id)
     return ConversationOut(
         id=conv.id,
         type=conv.type,
@@ -85,7 +252,7 @@ def add_member(
     conversation_id: int,
     user_id: int,
     db: Session = Depends(get_db),
-    current: User = Depends(get_current_user),
+    current: Principal = Depends(get_current_principal),
 ) -> dict:
     conv = db.get(Conversation, conversation_id)
     if not conv:
@@ -99,7 +266,9 @@ def add_member(
     if existing:
         return {"ok": True}
     db.add(ConversationMember(conversation_id=conversation_id, user_id=user_id, role="member"))
+    conv.members_updated_at = func.now()
     db.commit()
+    from_thread.run(invalidate_members, conversation_id)
     return {"ok": True}
 
 
@@ -108,7 +277,7 @@ def remove_member(
     conversation_id: int,
     user_id: int,
     db: Session = Depends(get_db),
-    current: User = Depends(get_current_user),
+    current: Principal = Depends(get_current_principal),
 ) -> dict:
     conv = db.get(Conversation, conversation_id)
     if not conv:
@@ -122,6 +291,8 @@ def remove_member(
     if not m:
         raise HTTPException(status_code=404, detail="Member not found")
     db.delete(m)
+    conv.members_updated_at = func.now()
     db.commit()
+    from_thread.run(invalidate_members, conversation_id)
     return {"ok": True}
 
@@ -1,163 +1,220 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session, joinedload
-
-from app.core.deps import get_current_user
-from app.db.database import get_db
-from app.models.attachment import Attachment
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.deps import get_current_principal, get_read_async_db
+from app.core.etag import etag_headers, make_etag, not_modified
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.responses import FastJSONResponse
+from app.db.database import AsyncSessionLocal, get_async_db
+from app.models.conversation import Conversation
 from app.models.conversation_member import ConversationMember
 from app.models.message import Message
-from app.models.message_receipt import MessageReceipt
-from app.models.user import User
-from app.schemas.chat import MessageCreate, MessageOut, ReceiptUpdate
-from app.services.realtime import hub
+from app.schemas.chat import MessageCreate, MessageOut, MessagePage, ReadUpTo, ReceiptOut, ReceiptUpdate
+from app.services.message_service import (
+    advance_watermarks,
+    create_message,
+    message_dict,
+    publish_new_message,
+    receipt_status,
+)
+from app.services.export import export_messages, gzip_chunks
+from app.services.membership import ensure_member
+from app.services.principals import Principal
+from app.services.read_routing import read_replica_for
+from app.services.receipts import receipt_coalescer
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
 
-def _ensure_member(db: Session, conversation_id: int, user_id: int) -> ConversationMember:
-    m = db.query(ConversationMember).filter_by(conversation_id=conversation_id, user_id=user_id).first()
-    if not m:
-        raise HTTPException(status_code=403, detail="Not a member")
-    return m
+async def _history_etag(db: AsyncSession, conversation_id: int, shape: str, limit: int) -> str:
+    # Messages are append-only, so the newest id versions the first page (one PK lookup);
+    # the route shape and page size pick which body that page is.
+    last_id = await db.scalar(select(Conversation.last_message_id).where(Conversation.id == conversation_id))
+    return make_etag("history", shape, limit, conversation_id, last_id)
 
 
 @router.get("/conversation/{conversation_id}", response_model=list[MessageOut])
-def list_messages(
+async def list_messages(
+    request: Request,
     conversation_id: int,
     limit: int = Query(default=50, ge=1, le=200),
     before_id: int | None = None,
-    db: Session = Depends(get_db),
-    current: User = Depends(get_current_user),
-) -> list[MessageOut]:
-    _ensure_member(db, conversation_id, current.id)
+    db: AsyncSession = Depends(get_read_async_db),
+    current: Principal = Depends(get_current_principal),
+) -> Response:
+    await ensure_member(conversation_id, current.id)
+    headers = None
+    if before_id is None:
+        etag = await _history_etag(db, conversation_id, "list", limit)
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        headers = etag_headers(etag)
 
     q = (
-        db.query(Message)
-        .options(joinedload(Message.attachments))
-        .filter(Message.conversation_id == conversation_id)
+        select(Message)
+        .options(selectinload(Message.attachments))
+        .where(Message.conversation_id == conversation_id)
         .order_by(Message.id.desc())
     )
     if before_id is not None:
-        q = q.filter(Message.id < before_id)
-    msgs = q.limit(limit).all()
+        q = q.where(Message.id < before_id)
+    msgs = list(await db.scalars(q.limit(limit)))
     msgs.reverse()
 
-    out: list[MessageOut] = []
-    for m in msgs:
-        out.append(
-            MessageOut(
-                id=m.id,
-                conversation_id=m.conversation_id,
-                sender_id=m.sender_id,
-                body=m.body,
-                created_at=m.created_at,
-                attachments=[
-                    {
-                        "id": a.id,
-                        "kind": a.kind,
-                        "url": a.url,
-                        "mime_type": a.mime_type,
-                        "size": a.size,
-                    }
-                    for a in m.attachments
-                ],
-            )
-        )
-    return out
+    return FastJSONResponse([message_dict(m) for m in msgs], headers=headers)
+
+
+@router.get("/conversation/{conversation_id}/page", response_model=MessagePage)
+async def page_messages(
+    request: Request,
+    conversation_id: int,
+    cursor: str | None = None,
+    direction: str = Query(default="before", pattern="^(before|after)$"),
+    limit: int = Query(default=50, ge=1, le=200),
+    db: AsyncSession = Depends(get_read_async_db),
+    current: Principal = Depends(get_current_principal),
+) -> Response:
+    """Cursor-paginated history.
+
+    Without a cursor, `before` starts from the newest message and `after` from the oldest;
+    `next_cursor` continues in the same direction. Every page is a single range scan of
+    at most `limit + 1` rows on (conversation_id, id), however deep it is. The newest
+    page carries an ETag and answers If-None-Match with a 304 without loading rows.
+    """
+    await ensure_member(conversation_id, current.id)
+    headers = None
+    if not cursor and direction == "before":
+        etag = await _history_etag(db, conversation_id, "page", limit)
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        headers = etag_headers(etag)
+
+    anchor: int | None = None
+    if cursor:
+        c = decode_cursor(cursor)
+        direction, anchor = c.get("d"), c.get("id")
+        if direction not in ("before", "after") or not isinstance(anchor, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    q = select(Message).options(selectinload(Message.attachments)).where(Message.conversation_id == conversation_id)
+    if direction == "before":
+        if anchor is not None:
+            q = q.where(Message.id < anchor)
+        q = q.order_by(Message.id.desc())
+    else:
+        if anchor is not None:
+            q = q.where(Message.id > anchor)
+        q = q.order_by(Message.id.asc())
+    msgs = list(await db.scalars(q.limit(limit + 1)))
+
+    next_cursor = None
+    if len(msgs) > limit:
+        msgs = msgs[:limit]
+        next_cursor = encode_cursor({"d": direction, "id": msgs[-1].id})
+    if direction == "before":
+        msgs.reverse()
+    return FastJSONResponse({"items": [message_dict(m) for m in msgs], "next_cursor": next_cursor}, headers=headers)
+
+
+@router.get("/conversation/{conversation_id}/export")
+async def export_conversation(
+    conversation_id: int,
+    after_id: int | None = None,
+    gzip: bool = False,
+    current: Principal = Depends(get_current_principal),
+) -> StreamingResponse:
+    """Full history as NDJSON (optionally gzipped), streamed; resume with `after_id`."""
+    await ensure_member(conversation_id, current.id)
+    replica = await read_replica_for(current.id)
+    chunks = export_messages(replica.AsyncSessionLocal if replica else AsyncSessionLocal, conversation_id, after_id)
+    filename = f"conversation-{conversation_id}.ndjson"
+    if gzip:
+        chunks, filename = gzip_chunks(chunks), filename + ".gz"
+    return StreamingResponse(
+        chunks,
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.post("/conversation/{conversation_id}", response_model=MessageOut)
 async def send_message(
     conversation_id: int,
     payload: MessageCreate,
-    db: Session = Depends(get_db),
-    current: User = Depends(get_current_user),
-) -> MessageOut:
-    _ensure_member(db, conversation_id, current.id)
-
-    msg = Message(conversation_id=conversation_id, sender_id=current.id, body=payload.body or "")
-    db.add(msg)
-    db.flush()
-
-    if payload.attachment_ids:
-        attachments = db.query(Attachment).filter(Attachment.id.in_(payload.attachment_ids)).all()
-        for a in attachments:
-            a.message_id = msg.id
-            db.add(a)
-
-    # Create delivered receipts for other members
-    members = db.query(ConversationMember).filter_by(conversation_id=conversation_id).all()
-    recipients = [m.user_id for m in members if m.user_id != current.id]
-    for uid in recipients:
-        db.add(MessageReceipt(message_id=msg.id, user_id=uid, status="delivered"))
-
-    db.commit()
-    db.refresh(msg)
-
-    event = {
-        "type": "message:new",
-        "conversation_id": conversation_id,
-        "message": {
-            "id": msg.id,
-            "conversation_id": msg.conversation_id,
-            "sender_id": msg.sender_id,
-            "body": msg.body,
-            "created_at": msg.created_at.isoformat(),
-            "attachments": [
-                {"id": a.id, "kind": a.kind, "url": a.url, "mime_type": a.mime_type, "size": a.size}
-                for a in msg.attachments
-            ],
-        },
-        "recipients": [current.id, *recipients],
-    }
-    await hub.publish(event)
-
-    return MessageOut(
-        id=msg.id,
-        conversation_id=msg.conversation_id,
-        sender_id=msg.sender_id,
-        body=msg.body,
-        created_at=msg.created_at,
-        attachments=[
-            {"id": a.id, "kind": a.kind, "url": a.url, "mime_type": a.mime_type, "size": a.size}
-            for a in msg.attachments
-        ],
-    )
+    db: AsyncSession = Depends(get_async_db),
+    current: Principal = Depends(get_current_principal),
+) -> Response:
+    await ensure_member(conversation_id, current.id)
+
+    msg, recipients = await create_message(db, conversation_id, current.id, payload)
+    message = message_dict(msg)
+    await publish_new_message(message, recipients)
+    return FastJSONResponse(message)
 
 
 @router.post("/{message_id}/receipt")
 async def update_receipt(
     message_id: int,
     payload: ReceiptUpdate,
-    db: Session = Depends(get_db),
-    current: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current: Principal = Depends(get_current_principal),
 ) -> dict:
-    msg = db.get(Message, message_id)
+    msg = await db.get(Message, message_id)
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
-    _ensure_member(db, msg.conversation_id, current.id)
+    await ensure_member(msg.conversation_id, current.id)
 
-    receipt = db.query(MessageReceipt).filter_by(message_id=message_id, user_id=current.id).first()
-    if not receipt:
-        receipt = MessageReceipt(message_id=message_id, user_id=current.id, status=payload.status)
-    else:
-        receipt.status = payload.status
-    db.add(receipt)
-    db.commit()
-
-    members = db.query(ConversationMember).filter_by(conversation_id=msg.conversation_id).all()
-    recipients = [m.user_id for m in members]
-    await hub.publish(
-        {
-            "type": "receipt:update",
-            "conversation_id": msg.conversation_id,
-            "message_id": message_id,
-            "user_id": current.id,
-            "status": payload.status,
-            "recipients": recipients,
-        }
+    await advance_watermarks(db, msg.conversation_id, current.id, message_id, payload.status)
+    await db.commit()
+
+    receipt_coalescer.add(msg.conversation_id, current.id, message_id, payload.status)
+    return {"ok": True}
+
+
+@router.post("/conversation/{conversation_id}/read-up-to")
+async def read_up_to(
+    conversation_id: int,
+    payload: ReadUpTo,
+    db: AsyncSession = Depends(get_async_db),
+    current: Principal = Depends(get_current_principal),
+) -> dict:
+    """Acknowledge every message up to `message_id` in one statement."""
+    await ensure_member(conversation_id, current.id)
+    exists = await db.scalar(
+        select(Message.id).where(Message.id == payload.message_id, Message.conversation_id == conversation_id)
     )
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+
+    await advance_watermarks(db, conversation_id, current.id, payload.message_id, payload.status)
+    await db.commit()
+
+    receipt_coalescer.add(conversation_id, current.id, payload.message_id, payload.status)
     return {"ok": True}
 
+
+@router.get("/{message_id}/receipts", response_model=list[ReceiptOut])
+async def list_receipts(
+    message_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current: Principal = Depends(get_current_principal),
+) -> list[ReceiptOut]:
+    msg = await db.get(Message, message_id)
+    if not msg:
+        raise HTTPException(status_code=404, detail="Message not found")
+    await ensure_member(msg.conversation_id, current.id)
+
+    # Derived from member watermarks; there are no per-message receipt rows.
+    members = await db.scalars(
+        select(ConversationMember).where(
+            ConversationMember.conversation_id == msg.conversation_id, ConversationMember.user_id != msg.sender_id
+        )
+    )
+    return [ReceiptOut(user_id=m.user_id, status=receipt_status(m, message_id)) for m in members]
@@ -1,79 +1,260 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import or_, select
-from sqlalchemy.orm import Session
+import html
+from typing import Any
 
-from app.core.deps import get_current_user
-from app.db.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import Double, case, cast, func, literal_column, or_, select, union
+from sqlalchemy.orm import Session, aliased, selectinload
+
+from app.core.deps import get_current_principal, get_read_db
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.responses import FastJSONResponse
+from app.models.contact import Contact
 from app.models.conversation_member import ConversationMember
 from app.models.message import Message
 from app.models.profile import Profile
 from app.models.user import User
-from app.schemas.chat import MessageOut
+from app.schemas.chat import MessageSearchPage
+from app.services.message_service import message_dict
+from app.services.principals import Principal
+from app.services.search_index import InvertedIndex, get_index, tokenize
 
 router = APIRouter(prefix="/search", tags=["search"])
 
 
+USER_SEARCH_LIMIT = 20
+# Per-branch cap on trigram candidates, so a very common term can't make a search
+# score an unbounded number of users.
+USER_SEARCH_CANDIDATES = 200
+
+
+def _like_escape(term: str) -> str:
+    return term.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def _known_users(db: Session, user_id: int) -> tuple[set[int], set[int]]:
+    """(contacts, people sharing a conversation) for ranking."""
+    contacts = set(db.scalars(select(Contact.contact_user_id).where(Contact.owner_user_id == user_id)))
+    me = aliased(ConversationMember)
+    other = aliased(ConversationMember)
+    co_members = set(
+        db.scalars(
+            select(other.user_id)
+            .join(me, me.conversation_id == other.conversation_id)
+            .where(me.user_id == user_id, other.user_id != user_id)
+            .distinct()
+        )
+    )
+    return contacts, co_members
+
+
 @router.get("/users")
 def search_users(
     q: str = Query(min_length=1, max_length=100),
-    db: Session = Depends(get_db),
-    current: User = Depends(get_current_user),
-) -> list[dict]:
-    # MVP: search by email or display name
-    term = f"%{q.lower()}%"
-    users = (
-        db.query(User)
+    db: Session = Depends(get_read_db),
+    current: Principal = Depends(get_current_principal),
+) -> Response:
+    """People matching `q` by email or display name, contacts and chat partners first.
+
+    On Postgres, fuzzy (trigram similarity) and substring matches come from the pg_trgm
+    indexes, capped per column; terms shorter than a trigram only search people the
+    caller already knows. Prefix matches rank above fuzzy ones.
+    """
+    term = q.strip().lower()
+    if not term:
+        return FastJSONResponse([])
+    contacts, co_members = _known_users(db, current.id)
+    known = contacts | co_members
+
+    email = func.lower(User.email)
+    name = func.lower(func.coalesce(Profile.display_name, ""))
+    contains = f"%{_like_escape(term)}%"
+    prefix = f"{_like_escape(term)}%"
+    matches = or_(email.like(contains, escape="!"), name.like(contains, escape="!"))
+
+    q_users = (
+        select(User.id, User.email, Profile.display_name, Profile.avatar_url)
         .outerjoin(Profile, Profile.user_id == User.id)
-        .filter(User.id != current.id)
-        .filter(or_(User.email.ilike(term), Profile.display_name.ilike(term)))
-        .limit(20)
-        .all()
+        .where(User.id != current.id)
     )
-    out = []
-    for u in users:
-        dn = u.profile.display_name if u.profile else ""
-        if q.lower() not in u.email.lower() and dn and q.lower() not in dn.lower():
-            continue
-        out.append(
-            {
-                "id": u.id,
-                "email": u.email,
-                "display_name": dn or u.email,
-                "avatar_url": (u.profile.avatar_url if u.profile else None),
-            }
+    if db.get_bind().dialect.name == "postgresql" and len(term) >= 3:
+        email_hits = select(User.id).where(or_(email.like(contains, escape="!"), email.op("%")(term)))
+        indexed_name = func.lower(Profile.display_name)  # must match the index expression
+        name_hits = select(Profile.user_id).where(
+            or_(indexed_name.like(contains, escape="!"), indexed_name.op("%")(term))
         )
-    return out
+        branches = [email_hits.limit(USER_SEARCH_CANDIDATES), name_hits.limit(USER_SEARCH_CANDIDATES)]
+        if known:
+            # The capped branches take arbitrary matches, so people the caller knows are
+            # looked up on their own; otherwise a common term could leave them out.
+            branches.append(
+                select(User.id)
+                .outerjoin(Profile, Profile.user_id == User.id)
+                .where(User.id.in_(known), or_(matches, email.op("%")(term), name.op("%")(term)))
+            )
+        candidates = union(*branches).subquery()
+        score = (
+            func.greatest(func.similarity(email, term), func.similarity(name, term))
+            + case((or_(email.like(prefix, escape="!"), name.like(prefix, escape="!")), 0.5), else_=0.0)
+            + case((User.id.in_(contacts), 1.0), (User.id.in_(co_members), 0.5), else_=0.0)
+        )
+        rows = db.execute(
+            q_users.where(User.id.in_(select(candidates.c.id)))
+            .order_by(score.desc(), User.id)
+            .limit(USER_SEARCH_LIMIT)
+        ).all()
+    else:
+        if db.get_bind().dialect.name == "postgresql":
+            # Too short for the trigram indexes; stay within people the caller knows.
+            q_users = q_users.where(User.id.in_(known))
+        rows = db.execute(q_users.where(matches).limit(USER_SEARCH_CANDIDATES)).all()
+
+        def rank(row) -> tuple:
+            uid, em, dn = row[0], row[1].lower(), (row[2] or "").lower()
+            return (
+                uid not in contacts,
+                uid not in co_members,
+                not (em.startswith(term) or dn.startswith(term)),
+                uid,
+            )
+
+        rows = sorted(rows, key=rank)[:USER_SEARCH_LIMIT]
+
+    return FastJSONResponse(
+        [{"id": uid, "email": em, "display_name": dn or em, "avatar_url": avatar} for uid, em, dn, avatar in rows]
+    )
+
 
+SEARCH_TS_CONFIG = "english"  # must match the generated column in migration 006
+_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=20, MinWords=8, MaxFragments=2"
 
-@router.get("/messages", response_model=list[MessageOut])
+
+@router.get("/messages", response_model=MessageSearchPage)
 def search_messages(
     q: str = Query(min_length=1, max_length=200),
+    cursor: str | None = None,
     limit: int = Query(default=50, ge=1, le=200),
-    db: Session = Depends(get_db),
-    current: User = Depends(get_current_user),
-) -> list[MessageOut]:
-    term = f"%{q}%"
+    db: Session = Depends(get_read_db),
+    current: Principal = Depends(get_current_principal),
+) -> Response:
+    """Ranked full-text search over the caller's conversations.
+
+    With SEARCH_BACKEND=inverted, the built-in index answers (all words, newest first).
+    Otherwise on Postgres this uses the GIN-indexed `body_tsv` column with websearch
+    syntax ("quoted phrases", -exclusions, or); pages continue on (rank, id). Other
+    databases fall back to ILIKE, newest first.
+    """
+    after = decode_cursor(cursor) if cursor else None
     conv_ids = select(ConversationMember.conversation_id).where(ConversationMember.user_id == current.id)
-    msgs = (
-        db.query(Message)
-        .filter(Message.conversation_id.in_(conv_ids))
-        .filter(Message.body.ilike(term))
-        .order_by(Message.id.desc())
-        .limit(limit)
-        .all()
+    index = get_index()
+    if index is not None:
+        page = _search_inverted(db, index, q, conv_ids, after, limit)
+    elif db.get_bind().dialect.name == "postgresql":
+        page = _search_fts(db, q, conv_ids, after, limit)
+    else:
+        page = _search_ilike(db, q, conv_ids, after, limit)
+    return FastJSONResponse(page)
+
+
+def _search_fts(db: Session, q: str, conv_ids, after: dict | None, limit: int) -> dict[str, Any]:
+    tsq = func.websearch_to_tsquery(SEARCH_TS_CONFIG, q)
+    # ts_rank is `real`; compare as float8, which is what the cursor round-trips.
+    rank = cast(func.ts_rank(literal_column("messages.body_tsv"), tsq), Double)
+    page = select(Message.id, rank.label("rank")).where(
+        Message.conversation_id.in_(conv_ids), literal_column("messages.body_tsv").op("@@")(tsq)
     )
-    # return newest first for search results
-    return [
-        MessageOut(
-            id=m.id,
-            conversation_id=m.conversation_id,
-            sender_id=m.sender_id,
-            body=m.body,
-            created_at=m.created_at,
-            attachments=[],
-        )
-        for m in msgs
-    ]
+    if after:
+        try:
+            r, anchor = float(after["r"]), int(after["id"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        page = page.where((rank < r) | ((rank == r) & (Message.id < anchor)))
+    page = page.order_by(rank.desc(), Message.id.desc()).limit(limit + 1).subquery()
+
+    # Headlines are costly, so they are only built for the rows on this page. The body is
+    # HTML-escaped first, so the <mark> tags are the only markup in the snippet.
+    headline = func.ts_headline(SEARCH_TS_CONFIG, _html_escape(Message.body), tsq, _HEADLINE_OPTIONS)
+    rows = db.execute(
+        select(Message, page.c.rank, headline)
+        .join(page, page.c.id == Message.id)
+        .options(selectinload(Message.attachments))
+        .order_by(page.c.rank.desc(), Message.id.desc())
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor({"r": rows[-1][1], "id": rows[-1][0].id})
+    return {
+        "items": [{**message_dict(m), "snippet": snippet, "rank": r} for m, r, snippet in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+def _search_inverted(
+    db: Session, index: InvertedIndex, q: str, conv_ids, after: dict | None, limit: int
+) -> dict[str, Any]:
+    before_id = None
+    if after:
+        if not isinstance(after.get("id"), int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        before_id = after["id"]
+    index.catch_up(db)
+    ids = index.search(q, db.scalars(conv_ids).all(), before_id, limit + 1)
 
+    next_cursor = None
+    if len(ids) > limit:
+        ids = ids[:limit]
+        next_cursor = encode_cursor({"id": ids[-1]})
+    msgs = db.scalars(select(Message).options(selectinload(Message.attachments)).where(Message.id.in_(ids)))
+    by_id = {m.id: m for m in msgs}
+    terms = tokenize(q)
+    items = []
+    for mid in ids:
+        m = by_id.get(mid)
+        if m is not None:
+            needle = next((t for t in terms if t in m.body.lower()), q)
+            items.append({**message_dict(m), "snippet": _ilike_snippet(m.body, needle), "rank": None})
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def _search_ilike(db: Session, q: str, conv_ids, after: dict | None, limit: int) -> dict[str, Any]:
+    query = (
+        select(Message)
+        .options(selectinload(Message.attachments))
+        .where(Message.conversation_id.in_(conv_ids), Message.body.ilike(f"%{_like_escape(q)}%", escape="!"))
+    )
+    if after:
+        if not isinstance(after.get("id"), int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(Message.id < after["id"])
+    msgs = list(db.scalars(query.order_by(Message.id.desc()).limit(limit + 1)))
+
+    next_cursor = None
+    if len(msgs) > limit:
+        msgs = msgs[:limit]
+        next_cursor = encode_cursor({"id": msgs[-1].id})
+    return {
+        "items": [{**message_dict(m), "snippet": _ilike_snippet(m.body, q), "rank": None} for m in msgs],
+        "next_cursor": next_cursor,
+    }
+
+
+def _html_escape(body):
+    return func.replace(func.replace(func.replace(body, "&", "&amp;"), "<", "&lt;"), ">", "&gt;")
+
+
+def _ilike_snippet(body: str, q: str, width: int = 60) -> str:
+    i = body.lower().find(q.lower())
+    if i < 0:
+        return html.escape(body[: width * 2])
+    start = max(0, i - width)
+    end = i + len(q)
+    return (
+        html.escape(body[start:i])
+        + "<mark>"
+        + html.escape(body[i:end])
+        + "</mark>"
+        + html.escape(body[end : end + width])
+    )
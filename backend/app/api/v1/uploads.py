@@ -6,10 +6,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
-from app.core.deps import get_current_user
+from app.core.deps import get_current_principal
 from app.db.database import get_db
 from app.models.attachment import Attachment
-from app.models.user import User
+from app.services.principals import Principal
 from app.services.s3_service import presign_put
 
 router = APIRouter(prefix="/uploads", tags=["uploads"])
@@ -33,7 +33,7 @@ class PresignResponse(BaseModel):
 def create_presign(
     payload: PresignRequest,
     db: Session = Depends(get_db),
-    current: User = Depends(get_current_user),
+    current: Principal = Depends(get_current_principal),
 ) -> PresignResponse:
     # Key: user/date/filename-timestamp
     safe_name = payload.filename.replace("/", "_").replace("\\", "_")
@@ -1,30 +1,32 @@
 from __future__ import annotations
 
+from anyio import from_thread
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
-from app.core.deps import get_current_user
+from app.core.deps import get_current_principal, get_current_user
 from app.db.database import get_db
 from app.models.profile import Profile
 from app.models.user import User
 from app.schemas.user import ProfileUpdate, UserOut
+from app.services.principals import Principal, invalidate_principal, principal_from_user
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
-@router.get("/me", response_model=UserOut)
-def me(current: User = Depends(get_current_user)) -> UserOut:
+def _user_out(p: Principal) -> UserOut:
     return UserOut(
-        id=current.id,
-        email=current.email,
-        profile={
-            "display_name": current.profile.display_name if current.profile else "",
-            "avatar_url": current.profile.avatar_url if current.profile else None,
-            "status": current.profile.status if current.profile else "",
-        },
+        id=p.id,
+        email=p.email,
+        profile={"display_name": p.display_name, "avatar_url": p.avatar_url, "status": p.status},
     )
 
 
+@router.get("/me", response_model=UserOut)
+def me(current: Principal = Depends(get_current_principal)) -> UserOut:
+    return _user_out(current)
+
+
 @router.put("/me/profile", response_model=UserOut)
 def update_profile(
     payload: ProfileUpdate,
@@ -47,5 +49,6 @@ def update_profile(
     db.add(profile)
     db.commit()
     db.refresh(current)
-    return me(current)
-
+    # Sync endpoints run in a worker thread; hop to the event loop for the async invalidation.
+    from_thread.run(invalidate_principal, current.id)
+    return _user_out(principal_from_user(current))
@@ -1,16 +1,58 @@
 from __future__ import annotations
 
-import json
+from typing import Any
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
 from jose import JWTError
+from pydantic import ValidationError
 
 from app.core.security import decode_token
-from app.services.realtime import hub
+from app.db.database import AsyncSessionLocal
+from app.schemas.chat import MessageCreate
+from app.services.codec import JSON, MSGPACK, MSGPACK_SUBPROTOCOL, decode, msgpack_available
+from app.services.membership import ensure_member
+from app.services.message_service import create_message, message_dict, publish_new_message
+from app.services.principals import get_principal
+from app.services.read_routing import note_write
+from app.services.realtime import Connection, hub
+from app.services.typing import typing_tracker
 
 router = APIRouter(tags=["ws"])
 
 
+async def _store_message(user_id: int, conversation_id: int, payload: MessageCreate) -> tuple[dict[str, Any], list[int]]:
+    await ensure_member(conversation_id, user_id)
+    async with AsyncSessionLocal() as db:
+        msg, recipients = await create_message(db, conversation_id, user_id, payload)
+        message = message_dict(msg)
+    await note_write(user_id)
+    return message, recipients
+
+
+async def _handle_message_send(conn: Connection, user_id: int, event: dict[str, Any]) -> None:
+    # Same persistence path as POST /messages/conversation/{id}, on the already
+    # authenticated socket. `client_id` is echoed back so the client can correlate.
+    client_id = event.get("client_id")
+    conversation_id = event.get("conversation_id")
+    try:
+        if not isinstance(conversation_id, int):
+            raise HTTPException(status_code=400, detail="conversation_id required")
+        payload = MessageCreate(body=event.get("body") or "", attachment_ids=event.get("attachment_ids") or [])
+        message, recipients = await _store_message(user_id, conversation_id, payload)
+    except HTTPException as e:
+        conn.send_event({"type": "message:error", "client_id": client_id, "detail": e.detail})
+        return
+    except ValidationError:
+        conn.send_event({"type": "message:error", "client_id": client_id, "detail": "Invalid message"})
+        return
+    except Exception:
+        conn.send_event({"type": "message:error", "client_id": client_id, "detail": "Send failed"})
+        return
+
+    conn.send_event({"type": "message:ack", "client_id": client_id, "message_id": message["id"], "message": message})
+    await publish_new_message(message, recipients)
+
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket) -> None:
     # Browser WebSocket can't set Authorization headers reliably, so we support:
@@ -30,30 +72,51 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
     except (JWTError, ValueError):
         await websocket.close(code=4401)
         return
+    if await get_principal(user_id) is None:
+        await websocket.close(code=4401)
+        return
 
-    await hub.connect(user_id, websocket)
+    # `?resume_from=<seq>` replays events missed since the client's last seen seq.
+    try:
+        resume_from = int(websocket.query_params["resume_from"])
+    except (KeyError, ValueError):
+        resume_from = None
+
+    # JSON text frames by default; clients offering the `vibecheck.msgpack` subprotocol
+    # get binary MessagePack frames both ways.
+    fmt, subprotocol = JSON, None
+    if msgpack_available() and MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", []):
+        fmt, subprotocol = MSGPACK, MSGPACK_SUBPROTOCOL
+
+    conn = await hub.connect(user_id, websocket, resume_from=resume_from, fmt=fmt, subprotocol=subprotocol)
     try:
         while True:
-            raw = await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             # Client->server events (typing, etc.)
             try:
-                event = json.loads(raw)
+                event = decode(message["bytes"] if message.get("bytes") is not None else message["text"])
             except Exception:
                 continue
+            if not isinstance(event, dict):
+                continue
 
             etype = event.get("type")
-            if etype in {"typing:start", "typing:stop"}:
-                # Expect conversation_id, recipients (optional)
-                await hub.publish(
-                    {
-                        "type": etype,
-                        "conversation_id": event.get("conversation_id"),
-                        "user_id": user_id,
-                        "recipients": event.get("recipients") or hub.connected_user_ids(),  # MVP
-                    }
-                )
+            conversation_id = event.get("conversation_id")
+            if etype in {"typing:start", "typing:stop"} and isinstance(conversation_id, int):
+                # Recipients come from conversation membership; client-supplied ones are ignored.
+                if etype == "typing:start":
+                    await typing_tracker.start(user_id, conversation_id)
+                else:
+                    await typing_tracker.stop(user_id, conversation_id)
+            elif etype == "message:send":
+                await _handle_message_send(conn, user_id, event)
     except WebSocketDisconnect:
         pass
     finally:
         await hub.disconnect(user_id, websocket)
+        # Typing state is per process; another open socket here may still be typing.
+        if not hub.has_connections(user_id):
+            await typing_tracker.clear_user(user_id)
 
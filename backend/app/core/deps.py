@@ -1,26 +1,60 @@
 from __future__ import annotations
 
-from fastapi import Depends, HTTPException, status
+from collections.abc import AsyncIterator
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.security import decode_token
-from app.db.database import get_db
+from app.db.database import AsyncSessionLocal, SessionLocal, get_db
 from app.models.user import User
+from app.services.principals import Principal, get_principal
+from app.services.read_routing import note_write, read_replica_for
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+def _user_id_from_token(token: str) -> int:
     try:
         payload = decode_token(token)
-        user_id = int(payload.get("sub", "0"))
+        return int(payload.get("sub", "0"))
     except (JWTError, ValueError):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-    user = db.get(User, user_id)
+
+def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+    user = db.get(User, _user_id_from_token(token))
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
 
+
+async def get_current_principal(request: Request, token: str = Depends(oauth2_scheme)) -> Principal:
+    """Cached identity for endpoints that only need who is calling; no DB round trip when warm."""
+    principal = await get_principal(_user_id_from_token(token))
+    if not principal:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    # Any mutating request keeps the caller's following reads on the primary for a while.
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        await note_write(principal.id)
+    return principal
+
+
+async def get_read_db(current: Principal = Depends(get_current_principal)) -> AsyncIterator[Session]:
+    """Session for read-only sync endpoints: a healthy replica unless the caller just wrote."""
+    replica = await read_replica_for(current.id)
+    db = (replica.SessionLocal if replica else SessionLocal)()
+    try:
+        yield db
+    finally:
+        await run_in_threadpool(db.close)
+
+
+async def get_read_async_db(current: Principal = Depends(get_current_principal)) -> AsyncIterator[AsyncSession]:
+    replica = await read_replica_for(current.id)
+    async with (replica.AsyncSessionLocal if replica else AsyncSessionLocal)() as db:
+        yield db
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts: Any) -> str:
+    """Opaque weak ETag from a version tuple (ids, counts, timestamps)."""
+    return 'W/"' + hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest() + '"'
+
+
+def etag_headers(etag: str) -> dict[str, str]:
+    # `no-cache` makes browsers revalidate on every request, so they send If-None-Match
+    # themselves and transparently reuse their cached body on a 304.
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """A 304 to send instead of the body if the client's copy is current."""
+    given = request.headers.get("if-none-match")
+    if given and (given.strip() == "*" or etag in (t.strip() for t in given.split(","))):
+        return Response(status_code=304, headers=etag_headers(etag))
+    return None
@@ -0,0 +1,318 @@
+"""Bulk-load chat history from NDJSON through Postgres COPY.
+
+    python -m app.db.bulk_import --conversations conv.ndjson --members members.ndjson \\
+        --messages messages.ndjson.gz [--batch 100000] [--workers 4] [--defer-indexes]
+
+One JSON object per line (files may be gzipped):
+
+- conversations: {"id", "type", "title"?, "created_at"?}
+- members: {"conversation_id", "user_id", "role"?, "joined_at"?, "last_read_message_id"?}
+- messages: {"id", "conversation_id", "sender_id", "body", "created_at"?, "attachments"?: [
+  {"kind", "url", "mime_type"?, "size"?}]}, i.e. what the export endpoint produces.
+
+Conversation and message ids are kept as given, so they must not collide with existing
+rows (a collision fails that batch); users must already exist. Each batch is COPYed and
+committed on its own, with no per-message receipts and no realtime events; message batches
+are COPYed over `--workers` connections at once, since the load is bound by server CPU
+(the generated search column, foreign key checks). Afterwards the
+id sequences are moved past the imported ids, and imported conversations get their inbox
+columns, direct-pair keys and member read watermarks (history counts as read unless a
+member row says otherwise) filled in.
+
+`--defer-indexes` drops the secondary indexes of messages and attachments for the load
+and rebuilds them at the end, which is much faster for large imports; reads that need
+those indexes crawl meanwhile, so use it in a maintenance window.
+
+With SEARCH_BACKEND=inverted, rebuild the index (empty SEARCH_INDEX_DIR) if the imported
+message ids are lower than ones it has already seen.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.db.database import engine
+from app.db.partitions import ensure_partitions
+
+try:
+    import orjson
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
+
+DEFAULT_BATCH = 100_000
+DEFERRABLE_TABLES = ("messages", "attachments")
+INDEX_BUILD_MEMORY = "1GB"
+
+
+def _loads(line: str) -> Any:
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def _batches(path: str, size: int) -> Iterator[list[dict]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        batch = []
+        for line in f:
+            if line.strip():
+                batch.append(_loads(line))
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _copy(conn: Connection, table: str, columns: tuple[str, ...], rows: Iterator[tuple]) -> None:
+    cursor = conn.connection.driver_connection.cursor()
+    with cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+
+
+def _begin_batch(conn: Connection) -> None:
+    # A crash can lose the last few commits but never corrupts; the import is re-runnable
+    # from the failed file anyway.
+    conn.execute(text("SET LOCAL synchronous_commit = off"))
+
+
+def import_conversations(path: str, batch: int, now: str) -> set[int]:
+    ids: set[int] = set()
+    for rows in _batches(path, batch):
+        with engine.begin() as conn:
+            _begin_batch(conn)
+            _copy(
+                conn,
+                "conversations",
+                ("id", "type", "title", "created_at", "last_activity_at"),
+                (
+                    (r["id"], r.get("type") or "group", r.get("title"), r.get("created_at") or now, r.get("created_at") or now)
+                    for r in rows
+                ),
+            )
+        ids.update(r["id"] for r in rows)
+    return ids
+
+
+def import_members(path: str, batch: int, now: str) -> int:
+    count = 0
+    for rows in _batches(path, batch):
+        with engine.begin() as conn:
+            _begin_batch(conn)
+            _copy(
+                conn,
+                "conversation_members",
+                ("conversation_id", "user_id", "role", "joined_at", "last_delivered_message_id", "last_read_message_id"),
+                (
+                    (
+                        r["conversation_id"],
+                        r["user_id"],
+                        r.get("role") or "member",
+                        r.get("joined_at") or now,
+                        r.get("last_read_message_id"),
+                        r.get("last_read_message_id"),
+                    )
+                    for r in rows
+                ),
+            )
+        count += len(rows)
+    return count
+
+
+def _copy_messages(rows: list[dict], now: str) -> None:
+    with engine.begin() as conn:
+        _begin_batch(conn)
+        _copy(
+            conn,
+            "messages",
+            ("id", "conversation_id", "sender_id", "body", "created_at"),
+            ((r["id"], r["conversation_id"], r["sender_id"], r.get("body") or "", r.get("created_at") or now) for r in rows),
+        )
+        _copy(
+            conn,
+            "attachments",
+            ("message_id", "kind", "url", "mime_type", "size"),
+            (
+                (r["id"], a.get("kind") or "file", a["url"], a.get("mime_type"), a.get("size"))
+                for r in rows
+                for a in r.get("attachments") or ()
+            ),
+        )
+
+
+def import_messages(path: str, batch: int, now: str, workers: int) -> tuple[int, set[int]]:
+    count = 0
+    touched: set[int] = set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight: deque[Future] = deque()
+        for rows in _batches(path, batch):
+            # Partitions are created here, one batch at a time, so workers never race on DDL.
+            with engine.begin() as conn:
+                ensure_partitions(
+                    conn, settings.MESSAGE_PARTITION_SIZE, settings.MESSAGE_PARTITIONS_AHEAD, max(r["id"] for r in rows)
+                )
+            in_flight.append(pool.submit(_copy_messages, rows, now))
+            count += len(rows)
+            touched.update(r["conversation_id"] for r in rows)
+            # Bounded read-ahead: at most one parsed batch waiting per worker.
+            while len(in_flight) > workers:
+                in_flight.popleft().result()
+        for future in in_flight:
+            future.result()
+    return count, touched
+
+
+def _secondary_indexes(conn: Connection, table: str) -> list[tuple[str, str]]:
+    return conn.execute(
+        text(
+            """
+            SELECT i.relname, pg_get_indexdef(i.oid)
+            FROM pg_index AS x
+            JOIN pg_class AS i ON i.oid = x.indexrelid
+            WHERE x.indrelid = CAST(:table AS regclass) AND NOT x.indisunique AND NOT x.indisprimary
+            """
+        ),
+        {"table": table},
+    ).all()
+
+
+def _bump_sequence(conn: Connection, table: str) -> None:
+    seq = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar_one()
+    conn.execute(
+        text(f"SELECT setval(:seq, greatest((SELECT coalesce(max(id), 1) FROM {table}), (SELECT last_value FROM {seq})))"),
+        {"seq": seq},
+    )
+
+
+def finish(conn: Connection, new_conversations: set[int], touched: set[int]) -> None:
+    for table in ("conversations", "conversation_members", "messages", "attachments"):
+        _bump_sequence(conn, table)
+
+    # Inbox columns, as create_message would have left them; never moved backwards.
+    conn.execute(
+        text(
+            """
+            UPDATE conversations AS c
+            SET last_message_id = m.id, last_activity_at = m.created_at
+            FROM unnest(CAST(:ids AS integer[])) AS t(id)
+            CROSS JOIN LATERAL (
+                SELECT id, created_at FROM messages WHERE conversation_id = t.id ORDER BY id DESC LIMIT 1
+            ) AS m
+            WHERE c.id = t.id AND (c.last_message_id IS NULL OR c.last_message_id < m.id)
+            """
+        ),
+        {"ids": sorted(touched)},
+    )
+    if not new_conversations:
+        return
+    ids = {"ids": sorted(new_conversations)}
+    # Same rule as migration 005; pairs another conversation already holds are left alone.
+    conn.execute(
+        text(
+            """
+            UPDATE conversations AS c
+            SET direct_user_low_id = p.low_id,
+                direct_user_high_id = p.high_id
+            FROM (
+                SELECT DISTINCT ON (low_id, high_id) conversation_id, low_id, high_id
+                FROM (
+                    SELECT cm.conversation_id, min(cm.user_id) AS low_id, max(cm.user_id) AS high_id
+                    FROM conversation_members AS cm
+                    JOIN conversations AS c2 ON c2.id = cm.conversation_id
+                    WHERE c2.type = 'direct' AND cm.conversation_id = ANY(:ids)
+                    GROUP BY cm.conversation_id
+                    HAVING count(*) = 2
+                ) AS pairs
+                ORDER BY low_id, high_id, conversation_id
+            ) AS p
+            WHERE c.id = p.conversation_id
+              AND NOT EXISTS (
+                  SELECT 1 FROM conversations AS o
+                  WHERE o.direct_user_low_id = p.low_id AND o.direct_user_high_id = p.high_id
+              )
+            """
+        ),
+        ids,
+    )
+    conn.execute(
+        text(
+            """
+            UPDATE conversation_members AS cm
+            SET last_read_message_id = c.last_message_id,
+                last_delivered_message_id = c.last_message_id
+            FROM conversations AS c
+            WHERE c.id = cm.conversation_id AND cm.conversation_id = ANY(:ids)
+              AND cm.last_read_message_id IS NULL AND c.last_message_id IS NOT NULL
+            """
+        ),
+        ids,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.db.bulk_import")
+    parser.add_argument("--conversations")
+    parser.add_argument("--members")
+    parser.add_argument("--messages")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--defer-indexes", action="store_true")
+    args = parser.parse_args()
+    if engine.dialect.name != "postgresql":
+        parser.error("bulk import needs PostgreSQL")
+
+    started = time.monotonic()
+    now = datetime.now(timezone.utc).isoformat()
+    deferred: list[tuple[str, str]] = []
+    if args.defer_indexes:
+        with engine.begin() as conn:
+            for table in DEFERRABLE_TABLES:
+                deferred += _secondary_indexes(conn, table)
+            for name, definition in deferred:
+                print(f"deferring: {definition}")  # enough to rebuild by hand if this dies
+                conn.execute(text(f"DROP INDEX {name}"))
+
+    new_conversations: set[int] = set()
+    touched: set[int] = set()
+    messages = 0
+    try:
+        if args.conversations:
+            new_conversations = import_conversations(args.conversations, args.batch, now)
+            print(f"conversations: {len(new_conversations)}")
+        if args.members:
+            print(f"members: {import_members(args.members, args.batch, now)}")
+        if args.messages:
+            messages, touched = import_messages(args.messages, args.batch, now, max(args.workers, 1))
+            print(f"messages: {messages} ({messages / max(time.monotonic() - started, 1e-9):.0f}/s)")
+    finally:
+        if deferred:
+            rebuild_started = time.monotonic()
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL maintenance_work_mem = '{INDEX_BUILD_MEMORY}'"))
+                for _, definition in deferred:
+                    # Definitions of partitioned parents say ON ONLY, which would skip the partitions.
+                    conn.execute(text(definition.replace(" ON ONLY ", " ON ", 1)))
+            print(f"rebuilt {len(deferred)} indexes in {time.monotonic() - rebuild_started:.1f}s")
+
+    with engine.begin() as conn:
+        finish(conn, new_conversations, touched | new_conversations)
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(
+            text("ANALYZE conversations, conversation_members, messages, attachments")
+        )
+    print(f"done in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
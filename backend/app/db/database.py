@@ -1,6 +1,13 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+import math
+from dataclasses import dataclass
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
@@ -15,14 +22,95 @@ def _normalize_db_url(url: str) -> str:
     return url
 
 
+def _normalize_async_db_url(url: str) -> str:
+    # psycopg 3 serves both engines under the same driver name; SQLite needs aiosqlite.
+    url = _normalize_db_url(url)
+    if url.startswith("sqlite://"):
+        url = url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+
 engine = create_engine(_normalize_db_url(settings.DATABASE_URL), pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(_normalize_async_db_url(settings.DATABASE_URL), pool_pre_ping=True)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+@dataclass
+class Replica:
+    """A read replica with its own pools; reads skip it while its health check fails."""
+
+    url: str
+    engine: Engine
+    SessionLocal: sessionmaker
+    async_engine: AsyncEngine
+    AsyncSessionLocal: async_sessionmaker
+    healthy: bool = True
+
+
+def _make_replica(url: str) -> Replica:
+    # A replica that stops answering must fail fast rather than hang reads and health checks.
+    connect_args = {}
+    if _normalize_db_url(url).startswith("postgresql"):
+        connect_args["connect_timeout"] = max(2, math.ceil(settings.REPLICA_HEALTH_CHECK_TIMEOUT_SECONDS))
+    sync_engine = create_engine(_normalize_db_url(url), pool_pre_ping=True, connect_args=connect_args)
+    replica_async_engine = create_async_engine(
+        _normalize_async_db_url(url), pool_pre_ping=True, connect_args=connect_args
+    )
+    return Replica(
+        url=url,
+        engine=sync_engine,
+        SessionLocal=sessionmaker(autocommit=False, autoflush=False, bind=sync_engine),
+        async_engine=replica_async_engine,
+        AsyncSessionLocal=async_sessionmaker(replica_async_engine, autoflush=False, expire_on_commit=False),
+    )
+
+
+replicas = [_make_replica(u.strip()) for u in settings.DATABASE_REPLICA_URLS.split(",") if u.strip()]
+_next_replica = itertools.count()
+
+
+def pick_replica() -> Replica | None:
+    """Round-robin over healthy replicas; None means read from the primary."""
+    healthy = [r for r in replicas if r.healthy]
+    return healthy[next(_next_replica) % len(healthy)] if healthy else None
+
+
+async def _check_replica(replica: Replica) -> None:
+    async with replica.async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def check_replicas() -> None:
+    # Concurrently, and with the connect inside the timeout, so one dead replica
+    # neither delays nor hangs the others' checks.
+    results = await asyncio.gather(
+        *(asyncio.wait_for(_check_replica(r), settings.REPLICA_HEALTH_CHECK_TIMEOUT_SECONDS) for r in replicas),
+        return_exceptions=True,
+    )
+    for replica, result in zip(replicas, results):
+        replica.healthy = not isinstance(result, BaseException)
+
+
+async def run_replica_health_checks() -> None:
+    while True:
+        await check_replicas()
+        await asyncio.sleep(settings.REPLICA_HEALTH_CHECK_SECONDS)
+
 
 def get_db():
+    # Sync sessions are only for plain `def` endpoints, which FastAPI runs in its
+    # threadpool. `async def` endpoints must use get_async_db so they never block the
+    # event loop that also drives every WebSocket.
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
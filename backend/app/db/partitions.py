@@ -0,0 +1,173 @@
+"""Maintenance for the range-partitioned `messages` table (see migration 008).
+
+    python -m app.db.partitions ensure
+    python -m app.db.partitions archive --before-id 20000000 [--mode table|export] [--dest ./archive]
+
+`ensure` keeps MESSAGE_PARTITIONS_AHEAD empty partitions ahead of the newest message;
+start.py runs it on every deploy, and busy installs should also run it from cron (it is
+idempotent, and a no-op on databases other than Postgres). `archive` detaches every partition lying entirely
+below `--before-id`: with `table` the partition moves to the `archive` schema, with
+`export` it is written to `<dest>/<partition>.ndjson.gz` and dropped. Attachments and
+legacy receipts of archived messages move to `archive.attachments` /
+`archive.message_receipts` first, since rows referencing a partition block detaching it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import re
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.db.database import engine
+
+ARCHIVE_SCHEMA = "archive"
+EXPORT_BATCH = 5000
+
+_BOUND_RE = re.compile(r"FROM \((\w+)\) TO \((\w+)\)")
+
+
+def list_partitions(conn: Connection) -> list[tuple[str, int | None, int | None]]:
+    """(name, lower, upper) per partition, oldest first; None stands for MINVALUE/MAXVALUE."""
+    rows = conn.execute(
+        text(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits AS i
+            JOIN pg_class AS c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'messages'::regclass
+            """
+        )
+    ).all()
+    out = []
+    for name, bound in rows:
+        m = _BOUND_RE.search(bound)
+        if not m:
+            continue
+        lower, upper = (int(v) if v.lstrip("-").isdigit() else None for v in m.groups())
+        out.append((name, lower, upper))
+    return sorted(out, key=lambda p: float("-inf") if p[1] is None else p[1])
+
+
+def ensure_partitions(conn: Connection, size: int, ahead: int, up_to: int = 0) -> list[str]:
+    """Create partitions until `ahead` empty ones lie past max(newest message id, `up_to`)."""
+    # Replicas starting together (and cron) would otherwise race to create the same table.
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('messages_partitions'))"))
+    partitions = list_partitions(conn)
+    top = max((p[2] for p in partitions if p[2] is not None), default=0)
+    max_id = max(conn.execute(text("SELECT coalesce(max(id), 0) FROM messages")).scalar_one(), up_to)
+    created = []
+    while top < max_id + ahead * size:
+        name = f"messages_p{top // size:04d}"
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF messages FOR VALUES FROM ({top}) TO ({top + size})"))
+        created.append(name)
+        top += size
+    return created
+
+
+def _ensure_archive_tables(conn: Connection) -> None:
+    conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+    for table in ("attachments", "message_receipts"):
+        conn.execute(
+            text(f"CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.{table} (LIKE public.{table} INCLUDING DEFAULTS)")
+        )
+
+
+def _id_range(lower: int | None, upper: int) -> str:
+    return f"message_id < {upper}" if lower is None else f"message_id >= {lower} AND message_id < {upper}"
+
+
+def _export(conn: Connection, name: str, lower: int | None, upper: int, dest: str) -> str:
+    """Write the partition's messages, with their attachments, as gzipped NDJSON."""
+    os.makedirs(dest, exist_ok=True)
+    path = os.path.join(dest, f"{name}.ndjson.gz")
+    tmp = path + ".tmp"
+    after = -1 if lower is None else lower - 1
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        while True:
+            rows = conn.execute(
+                text(
+                    f"SELECT id, conversation_id, sender_id, body, created_at, edited_at, deleted_at "
+                    f"FROM {name} WHERE id > :after ORDER BY id LIMIT {EXPORT_BATCH}"
+                ),
+                {"after": after},
+            ).mappings().all()
+            if not rows:
+                break
+            ids = [r["id"] for r in rows]
+            attachments: dict[int, list[dict]] = {}
+            for a in conn.execute(
+                text(
+                    f"SELECT id, message_id, kind, url, mime_type, size FROM {ARCHIVE_SCHEMA}.attachments "
+                    "WHERE message_id = ANY(:ids)"
+                ),
+                {"ids": ids},
+            ).mappings():
+                attachments.setdefault(a["message_id"], []).append(dict(a))
+            for r in rows:
+                f.write(json.dumps({**r, "attachments": attachments.get(r["id"], [])}, default=str) + "\n")
+            after = ids[-1]
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def archive_partitions(conn: Connection, before_id: int, mode: str, dest: str) -> list[str]:
+    max_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM messages")).scalar_one()
+    done = []
+    for name, lower, upper in list_partitions(conn):
+        # Only whole partitions below the cutoff, and never the one taking new messages.
+        if upper is None or upper > before_id or upper > max_id:
+            continue
+        _ensure_archive_tables(conn)
+        for table in ("attachments", "message_receipts"):
+            conn.execute(
+                text(
+                    f"WITH moved AS (DELETE FROM public.{table} WHERE {_id_range(lower, upper)} RETURNING *) "
+                    f"INSERT INTO {ARCHIVE_SCHEMA}.{table} SELECT * FROM moved"
+                )
+            )
+        conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+        if mode == "export":
+            path = _export(conn, name, lower, upper, dest)
+            conn.execute(text(f"DELETE FROM {ARCHIVE_SCHEMA}.attachments WHERE {_id_range(lower, upper)}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+            done.append(f"{name} -> {path}")
+        else:
+            conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+            done.append(f"{name} -> {ARCHIVE_SCHEMA}.{name}")
+    return done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.db.partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("ensure", help="create partitions ahead of the newest message")
+    archive = sub.add_parser("archive", help="detach partitions entirely below --before-id")
+    archive.add_argument("--before-id", type=int, required=True)
+    archive.add_argument("--mode", choices=("table", "export"), default="table")
+    archive.add_argument("--dest", default="./archive")
+    args = parser.parse_args()
+    if engine.dialect.name != "postgresql":
+        if args.command == "ensure":
+            return  # nothing is partitioned
+        parser.error("archiving needs PostgreSQL")
+
+    # One transaction per command: a failed export leaves the partition attached.
+    with engine.begin() as conn:
+        if args.command == "ensure":
+            done = ensure_partitions(conn, settings.MESSAGE_PARTITION_SIZE, settings.MESSAGE_PARTITIONS_AHEAD)
+        else:
+            done = archive_partitions(conn, args.before_id, args.mode, args.dest)
+    for line in done:
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import asyncio
+
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.auth import router as auth_router
@@ -16,7 +19,9 @@ from app.api.v1.uploads import router as uploads_router
 from app.api.v1.users import router as users_router
 from app.api.v1.ws import router as ws_router
 from app.core.config import settings
+from app.db.database import replicas, run_replica_health_checks
 from app.services.realtime import hub
+from app.services.search_index import get_index
 
 # Allowed CORS origins (computed once at startup)
 _ALLOWED_ORIGINS: set[str] = set()
@@ -50,6 +55,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag"],
     )
 
     app.include_router(auth_router, prefix="/api/v1")
@@ -68,10 +74,20 @@ def create_app() -> FastAPI:
     @app.on_event("startup")
     async def _startup() -> None:
         await hub.startup()
+        # Opened here so a second process on the same SEARCH_INDEX_DIR fails at startup.
+        await run_in_threadpool(get_index)
+        if replicas:
+            app.state.replica_health = asyncio.create_task(run_replica_health_checks())
 
     @app.on_event("shutdown")
     async def _shutdown() -> None:
+        task = getattr(app.state, "replica_health", None)
+        if task:
+            task.cancel()
         await hub.shutdown()
+        index = get_index()
+        if index is not None:
+            await run_in_threadpool(index.flush)
 
     return app
 
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Literal
 
-from sqlalchemy import DateTime, Integer, String, func
+from sqlalchemy import DateTime, Index, Integer, String, UniqueConstraint, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -14,11 +14,24 @@ ConversationType = Literal["direct", "group"]
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    # Inbox ordering: most recent activity first, id as tie-breaker for keyset paging.
+    __table_args__ = (
+        Index("ix_conversations_last_activity_at_id", text("last_activity_at DESC"), text("id DESC")),
+        # One direct conversation per pair of users; NULL for groups.
+        UniqueConstraint("direct_user_low_id", "direct_user_high_id", name="uq_conversations_direct_pair"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     type: Mapped[str] = mapped_column(String(16), nullable=False)  # direct|group
     title: Mapped[str | None] = mapped_column(String(120), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # Denormalized on send so the inbox never has to scan messages.
+    last_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    last_activity_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    direct_user_low_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    direct_user_high_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Bumped when members are added or removed; part of the conversation list ETag.
+    members_updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     members: Mapped[list["ConversationMember"]] = relationship(
         back_populates="conversation",
@@ -21,6 +21,9 @@ class ConversationMember(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
     role: Mapped[str] = mapped_column(String(16), default="member")
     joined_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # Receipt watermarks: every message up to these ids is delivered to / read by this member.
+    last_delivered_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    last_read_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     conversation: Mapped["Conversation"] = relationship(back_populates="members")
     user: Mapped["User"] = relationship()
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, Text, func
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, Text, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -10,9 +10,13 @@ from app.db.base import Base
 
 class Message(Base):
     __tablename__ = "messages"
+    # On Postgres the table is range-partitioned by id (migration 008, app/db/partitions.py);
+    # filtering on id lets the planner skip partitions.
+    # Keyset pagination: WHERE conversation_id = ? AND id < ? ORDER BY id DESC LIMIT n
+    __table_args__ = (Index("ix_messages_conversation_id_id", "conversation_id", text("id DESC")),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    conversation_id: Mapped[int] = mapped_column(ForeignKey("conversations.id", ondelete="CASCADE"), index=True)
+    conversation_id: Mapped[int] = mapped_column(ForeignKey("conversations.id", ondelete="CASCADE"))
     sender_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
     body: Mapped[str] = mapped_column(Text, default="")
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
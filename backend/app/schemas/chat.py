@@ -25,6 +25,28 @@ class ConversationOut(BaseModel):
     member_user_ids: list[int]
 
 
+class MessagePreview(BaseModel):
+    id: int
+    sender_id: int
+    body: str  # truncated
+    created_at: datetime
+
+
+class InboxItem(BaseModel):
+    id: int
+    type: str
+    title: str | None = None
+    member_user_ids: list[int]
+    last_message: MessagePreview | None = None
+    last_activity_at: datetime
+    unread_count: int  # capped, see UNREAD_COUNT_CAP
+
+
+class InboxPage(BaseModel):
+    items: list[InboxItem]
+    next_cursor: str | None = None
+
+
 class MessageCreate(BaseModel):
     body: str = Field(default="", max_length=10000)
     attachment_ids: list[int] = Field(default_factory=list)
@@ -47,6 +69,32 @@ class MessageOut(BaseModel):
     attachments: list[AttachmentOut] = Field(default_factory=list)
 
 
+class MessagePage(BaseModel):
+    items: list[MessageOut]  # oldest first
+    next_cursor: str | None = None
+
+
+class MessageSearchHit(MessageOut):
+    # HTML-escaped excerpt with matches wrapped in <mark>…</mark>.
+    snippet: str
+    rank: float | None = None  # None on the ILIKE fallback
+
+
+class MessageSearchPage(BaseModel):
+    items: list[MessageSearchHit]  # best match first
+    next_cursor: str | None = None
+
+
 class ReceiptUpdate(BaseModel):
     status: str = Field(pattern="^(delivered|read)$")
 
+
+class ReadUpTo(BaseModel):
+    message_id: int
+    status: str = Field(default="read", pattern="^(delivered|read)$")
+
+
+class ReceiptOut(BaseModel):
+    user_id: int
+    status: str  # sent|delivered|read
+
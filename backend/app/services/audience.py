@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.contact import Contact
+from app.models.conversation_member import ConversationMember
+from app.services.cache import LRUCache
+
+_presence_audience = LRUCache(settings.PRESENCE_AUDIENCE_TTL_SECONDS, settings.PRESENCE_AUDIENCE_CACHE_SIZE)
+
+
+async def _load_presence_audiences(user_ids: list[int]) -> dict[int, set[int]]:
+    """Users who share a conversation or a contact (either direction) with each of `user_ids`."""
+    out: dict[int, set[int]] = {uid: set() for uid in user_ids}
+    me = aliased(ConversationMember)
+    other = aliased(ConversationMember)
+    async with AsyncSessionLocal() as db:
+        co_members = await db.execute(
+            select(me.user_id, other.user_id)
+            .join(other, other.conversation_id == me.conversation_id)
+            .where(me.user_id.in_(user_ids), other.user_id != me.user_id)
+            .distinct()
+        )
+        for uid, peer in co_members:
+            out[uid].add(peer)
+
+        contacts = await db.execute(
+            select(Contact.owner_user_id, Contact.contact_user_id).where(
+                Contact.owner_user_id.in_(user_ids) | Contact.contact_user_id.in_(user_ids)
+            )
+        )
+        for owner, contact in contacts:
+            if owner in out:
+                out[owner].add(contact)
+            if contact in out:
+                out[contact].add(owner)
+    return out
+
+
+async def presence_audiences(user_ids: Iterable[int]) -> dict[int, frozenset[int]]:
+    """Cached presence audiences; all misses are loaded in one round of queries."""
+    out: dict[int, frozenset[int]] = {}
+    misses: list[int] = []
+    for uid in dict.fromkeys(user_ids):
+        cached = _presence_audience.get(uid)
+        if cached is None:
+            misses.append(uid)
+        else:
+            out[uid] = cached
+    if misses:
+        loaded = await _load_presence_audiences(misses)
+        for uid, audience in loaded.items():
+            value = frozenset(audience)
+            _presence_audience.set(uid, value)
+            out[uid] = value
+    return out
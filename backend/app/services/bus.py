@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app.core.config import settings
+
+NODE_CHANNEL = "vibecheck:node:{node_id}"
+NODE_STREAM = "vibecheck:stream:{node_id}"
+STREAM_GROUP = "hub"
+
+Handler = Callable[[list[dict[str, Any]]], Awaitable[None]]
+
+
+class PubSubBus:
+    """Fire-and-forget delivery over one pub/sub channel per node."""
+
+    def __init__(self, redis: Any, node_id: str, handler: Handler) -> None:
+        self._redis = redis
+        self._node_id = node_id
+        self._handler = handler
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    async def send(self, node_id: str, event: dict[str, Any]) -> None:
+        await self._redis.publish(NODE_CHANNEL.format(node_id=node_id), json.dumps(event))
+
+    async def _run(self) -> None:
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(NODE_CHANNEL.format(node_id=self._node_id))
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            try:
+                event = json.loads(message.get("data"))
+            except Exception:
+                continue
+            await _handle(self._handler, [event])
+
+
+class StreamsBus:
+    """Durable delivery over one Redis stream per node, read through a consumer group.
+
+    Entries stay pending until acknowledged, so events sent while a node restarts or
+    stalls are picked up when it comes back (given a stable NODE_ID). Reads are batched
+    and each stream is trimmed to EVENT_STREAM_MAXLEN.
+    """
+
+    def __init__(self, redis: Any, node_id: str, handler: Handler) -> None:
+        self._redis = redis
+        self._node_id = node_id
+        self._handler = handler
+        self._stream = NODE_STREAM.format(node_id=node_id)
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        await self._ensure_group()
+        self._task = asyncio.create_task(self._run())
+
+    async def _ensure_group(self) -> None:
+        try:
+            await self._redis.xgroup_create(self._stream, STREAM_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    async def send(self, node_id: str, event: dict[str, Any]) -> None:
+        stream = NODE_STREAM.format(node_id=node_id)
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.xadd(stream, {"e": json.dumps(event)}, maxlen=settings.EVENT_STREAM_MAXLEN, approximate=True)
+        # Streams of nodes that never come back expire instead of piling up.
+        pipe.expire(stream, settings.EVENT_STREAM_TTL_SECONDS)
+        await pipe.execute()
+
+    async def _run(self) -> None:
+        # Drain our own pending (delivered but unacked) entries first, then new ones.
+        cursor = "0"
+        while True:
+            try:
+                resp = await self._redis.xreadgroup(
+                    STREAM_GROUP,
+                    self._node_id,
+                    {self._stream: cursor},
+                    count=settings.EVENT_STREAM_BATCH,
+                    block=None if cursor == "0" else settings.EVENT_STREAM_BLOCK_MS,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # An idle stream expires (EVENT_STREAM_TTL_SECONDS) along with its group and
+                # the next XADD recreates it bare; recreate the group and read from the start.
+                if "NOGROUP" in str(e):
+                    try:
+                        await self._ensure_group()
+                        cursor = "0"
+                        continue
+                    except Exception:
+                        pass
+                await asyncio.sleep(1)
+                continue
+
+            entries = resp[0][1] if resp else []
+            if not entries:
+                if cursor == "0":
+                    cursor = ">"
+                await asyncio.sleep(0)
+                continue
+
+            events: list[dict[str, Any]] = []
+            for _, fields in entries:
+                try:
+                    events.append(json.loads(fields["e"]))
+                except Exception:
+                    continue
+            if events:
+                await _handle(self._handler, events)
+            await self._redis.xack(self._stream, STREAM_GROUP, *[entry_id for entry_id, _ in entries])
+
+
+async def _handle(handler: Handler, events: list[dict[str, Any]]) -> None:
+    # A bad batch is dropped rather than killing the reader loop.
+    try:
+        await handler(events)
+    except Exception:
+        pass
+
+
+def create_bus(redis: Any, node_id: str, handler: Handler) -> PubSubBus | StreamsBus:
+    if settings.EVENT_BUS == "streams":
+        return StreamsBus(redis, node_id, handler)
+    return PubSubBus(redis, node_id, handler)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class TTLCache:
+    """Tiny per-process cache; entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._data: dict[int, tuple[float, Any]] = {}
+
+    def get(self, key: int) -> Any | None:
+        hit = self._data.get(key)
+        if hit is None:
+            return None
+        expires, value = hit
+        if expires < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: int, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key: int) -> None:
+        self._data.pop(key, None)
+
+
+class LRUCache(TTLCache):
+    """TTLCache bounded to `maxsize` entries, evicting the least recently used."""
+
+    def __init__(self, ttl: float, maxsize: int) -> None:
+        super().__init__(ttl)
+        self.maxsize = maxsize
+        self._data: OrderedDict[int, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: int) -> Any | None:
+        value = super().get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def set(self, key: int, value: Any) -> None:
+        super().set(key, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
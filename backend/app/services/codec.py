@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any
+
+try:
+    import msgpack
+except Exception:  # pragma: no cover
+    msgpack = None  # type: ignore
+
+JSON = "json"
+MSGPACK = "msgpack"
+MSGPACK_SUBPROTOCOL = "vibecheck.msgpack"
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def encode(event: dict[str, Any], fmt: str) -> str | bytes:
+    if fmt == MSGPACK:
+        return msgpack.packb(event, use_bin_type=True)
+    return json.dumps(event)
+
+
+def decode(data: str | bytes) -> Any:
+    if isinstance(data, bytes):
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+
+def with_seq(payload: str | bytes, seq: int) -> str | bytes:
+    """Add a `seq` key to an already-encoded map without re-encoding the rest of it."""
+    if isinstance(payload, str):
+        return '{"seq":%d,%s' % (seq, payload[1:])
+
+    # MessagePack: bump the map header's entry count and prepend the new pair.
+    head = payload[0]
+    if 0x80 <= head <= 0x8E:
+        header, body = bytes([head + 1]), payload[1:]
+    elif head == 0x8F:
+        header, body = b"\xde" + struct.pack(">H", 16), payload[1:]
+    elif head == 0xDE:
+        (n,) = struct.unpack(">H", payload[1:3])
+        header = b"\xde" + struct.pack(">H", n + 1) if n < 0xFFFF else b"\xdf" + struct.pack(">I", n + 1)
+        body = payload[3:]
+    elif head == 0xDF:
+        (n,) = struct.unpack(">I", payload[1:5])
+        header, body = b"\xdf" + struct.pack(">I", n + 1), payload[5:]
+    else:
+        raise ValueError("payload is not a MessagePack map")
+    return header + msgpack.packb("seq") + msgpack.packb(seq) + body
+
+
+def json_to(frame: str, fmt: str) -> str | bytes:
+    """Convert a stored JSON frame (e.g. from the resume buffer) to `fmt`."""
+    return frame if fmt == JSON else encode(json.loads(frame), fmt)
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Any
+
+from app.core.config import settings
+from app.services.codec import with_seq
+
+SEQ_KEY = "vibecheck:seq:{user_id}"
+RING_KEY = "vibecheck:ring:{user_id}"
+
+# Assigns the next per-user sequence number and stores the sequenced frame in a
+# bounded sorted set scored by seq. ARGV[1] is the encoded event minus its leading "{".
+_APPEND_LUA = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('ZADD', KEYS[2], seq, '{"seq":' .. seq .. ',' .. ARGV[1])
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -(tonumber(ARGV[2]) + 1))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return seq
+"""
+
+
+class MemoryEventLog:
+    """Per-user sequence numbers and ring buffers for a single-process deployment.
+
+    Like the Redis keys, a user's log is dropped after `ttl` seconds without appends.
+    """
+
+    def __init__(self, size: int = settings.WS_RESUME_BUFFER_SIZE, ttl: int = settings.WS_RESUME_TTL_SECONDS) -> None:
+        self._ttl = ttl
+        self._seq: dict[int, int] = defaultdict(int)
+        self._ring: dict[int, deque[tuple[int, str]]] = defaultdict(lambda: deque(maxlen=size))
+        self._appended_at: OrderedDict[int, float] = OrderedDict()  # oldest append first
+
+    async def append(self, user_ids: list[int], payload: str) -> dict[int, int]:
+        now = time.monotonic()
+        self._expire(now)
+        seqs: dict[int, int] = {}
+        for uid in user_ids:
+            self._appended_at[uid] = now
+            self._appended_at.move_to_end(uid)
+            self._seq[uid] += 1
+            seq = self._seq[uid]
+            self._ring[uid].append((seq, with_seq(payload, seq)))
+            seqs[uid] = seq
+        return seqs
+
+    async def replay(self, user_id: int, after: int | None) -> tuple[int, list[tuple[int, str]] | None]:
+        current = self._seq.get(user_id, 0)
+        ring = list(self._ring.get(user_id, ()))
+        return current, _select(current, ring, after)
+
+    def _expire(self, now: float) -> None:
+        while self._appended_at:
+            uid, at = next(iter(self._appended_at.items()))
+            if at > now - self._ttl:
+                break
+            del self._appended_at[uid]
+            self._seq.pop(uid, None)
+            self._ring.pop(uid, None)
+
+
+class RedisEventLog:
+    """Cluster-wide variant: a user may reconnect to any node and still resume."""
+
+    def __init__(
+        self,
+        redis: Any,
+        size: int = settings.WS_RESUME_BUFFER_SIZE,
+        ttl: int = settings.WS_RESUME_TTL_SECONDS,
+    ) -> None:
+        self._redis = redis
+        self._size = size
+        self._ttl = ttl
+        self._append = redis.register_script(_APPEND_LUA)
+
+    async def append(self, user_ids: list[int], payload: str) -> dict[int, int]:
+        pipe = self._redis.pipeline(transaction=False)
+        body = payload[1:]
+        for uid in user_ids:
+            await self._append(
+                keys=[SEQ_KEY.format(user_id=uid), RING_KEY.format(user_id=uid)],
+                args=[body, self._size, self._ttl],
+                client=pipe,
+            )
+        return {uid: int(seq) for uid, seq in zip(user_ids, await pipe.execute())}
+
+    async def replay(self, user_id: int, after: int | None) -> tuple[int, list[tuple[int, str]] | None]:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.get(SEQ_KEY.format(user_id=user_id))
+        if after is not None:
+            pipe.zrange(RING_KEY.format(user_id=user_id), 0, -1, withscores=True)
+        results = await pipe.execute()
+        current = int(results[0] or 0)
+        ring = [(int(score), frame) for frame, score in results[1]] if after is not None else []
+        return current, _select(current, ring, after)
+
+
+def _select(current: int, ring: list[tuple[int, str]], after: int | None) -> list[tuple[int, str]] | None:
+    """Frames newer than `after`, or None when the buffer can no longer bridge the gap."""
+    if after is None or after == current:
+        return []
+    if after > current:
+        return None  # the server-side log was reset (e.g. expired); client must resync
+    if not ring or ring[0][0] > after + 1:
+        return None
+    return [(seq, frame) for seq, frame in ring if seq > after]
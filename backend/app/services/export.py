@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import zlib
+from collections.abc import AsyncIterator
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.responses import dumps
+from app.models.attachment import Attachment
+from app.models.message import Message
+
+EXPORT_BATCH = 1000
+
+
+async def export_messages(
+    session_factory: async_sessionmaker, conversation_id: int, after_id: int | None
+) -> AsyncIterator[bytes]:
+    """A conversation's messages as NDJSON, oldest first, one chunk per batch.
+
+    Rows come from a server-side cursor (`stream` + `yield_per`), so memory stays at one
+    batch however long the history is; attachments are fetched per batch. Each line has
+    the message `id`, which a client can pass back as `after_id` to resume.
+    """
+    # Its own session: the request's dependency sessions are closed before streaming starts.
+    async with session_factory() as db:
+        q = (
+            select(Message.id, Message.conversation_id, Message.sender_id, Message.body, Message.created_at)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.id)
+            .execution_options(yield_per=EXPORT_BATCH)
+        )
+        if after_id is not None:
+            q = q.where(Message.id > after_id)
+        result = await db.stream(q)
+        async for rows in result.partitions():
+            attachments: dict[int, list[dict]] = {}
+            for message_id, aid, kind, url, mime_type, size in await db.execute(
+                select(
+                    Attachment.message_id, Attachment.id, Attachment.kind, Attachment.url, Attachment.mime_type, Attachment.size
+                ).where(Attachment.message_id.in_([r[0] for r in rows]))
+            ):
+                attachments.setdefault(message_id, []).append(
+                    {"id": aid, "kind": kind, "url": url, "mime_type": mime_type, "size": size}
+                )
+            yield b"".join(
+                dumps(
+                    {
+                        "id": mid,
+                        "conversation_id": cid,
+                        "sender_id": sender_id,
+                        "body": body,
+                        "created_at": created_at,
+                        "attachments": attachments.get(mid, []),
+                    }
+                )
+                + b"\n"
+                for mid, cid, sender_id, body, created_at in rows
+            )
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.conversation_member import ConversationMember
+from app.services.cache import LRUCache
+from app.services.realtime import hub
+
+# conversation_id -> read-only {user_id: role}
+_members = LRUCache(settings.MEMBERSHIP_CACHE_TTL_SECONDS, settings.MEMBERSHIP_CACHE_SIZE)
+hub.on_control("members:invalidate", _members.invalidate)
+
+
+async def _load(conversation_id: int) -> Mapping[int, str]:
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(ConversationMember.user_id, ConversationMember.role).where(
+                ConversationMember.conversation_id == conversation_id
+            )
+        )
+        members = MappingProxyType({uid: role for uid, role in rows})
+    _members.set(conversation_id, members)
+    return members
+
+
+async def conversation_members(conversation_id: int) -> Mapping[int, str]:
+    cached = _members.get(conversation_id)
+    return cached if cached is not None else await _load(conversation_id)
+
+
+async def conversation_member_ids(conversation_id: int) -> frozenset[int]:
+    return frozenset(await conversation_members(conversation_id))
+
+
+async def ensure_member(conversation_id: int, user_id: int) -> str:
+    """Return the caller's role, or raise 403. A miss re-reads the database before refusing,
+    so someone added on another node is not turned away while the invalidation is in flight."""
+    members = await conversation_members(conversation_id)
+    if user_id not in members:
+        members = await _load(conversation_id)
+    role = members.get(user_id)
+    if role is None:
+        raise HTTPException(status_code=403, detail="Not a member")
+    return role
+
+
+async def invalidate_members(conversation_id: int) -> None:
+    """Call after adding or removing members; drops every node's cached copy."""
+    await hub.broadcast_control("members:invalidate", conversation_id)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.attachment import Attachment
+from app.models.conversation import Conversation
+from app.models.conversation_member import ConversationMember
+from app.models.message import Message
+from app.schemas.chat import MessageCreate
+from app.services.membership import conversation_member_ids
+from app.services.realtime import hub
+from app.services.search_index import get_index
+
+
+def message_dict(msg: Message) -> dict[str, Any]:
+    return {
+        "id": msg.id,
+        "conversation_id": msg.conversation_id,
+        "sender_id": msg.sender_id,
+        "body": msg.body,
+        "created_at": msg.created_at.isoformat(),
+        "attachments": [
+            {"id": a.id, "kind": a.kind, "url": a.url, "mime_type": a.mime_type, "size": a.size}
+            for a in msg.attachments
+        ],
+    }
+
+
+async def create_message(
+    db: AsyncSession, conversation_id: int, sender_id: int, payload: MessageCreate
+) -> tuple[Message, list[int]]:
+    """Persist a message (caller has checked membership). Returns it with the other members' ids."""
+    attachments: list[Attachment] = []
+    if payload.attachment_ids:
+        attachments = list(await db.scalars(select(Attachment).where(Attachment.id.in_(payload.attachment_ids))))
+
+    # Attachments are set through the relationship so message_dict() never lazy-loads;
+    # created_at comes back from the INSERT (eager server defaults).
+    msg = Message(conversation_id=conversation_id, sender_id=sender_id, body=payload.body or "", attachments=attachments)
+    db.add(msg)
+    await db.flush()
+
+    recipients = [uid for uid in await conversation_member_ids(conversation_id) if uid != sender_id]
+    # Receipts are per-member watermarks, so a send writes one row however big the group.
+    await advance_watermarks(db, conversation_id, sender_id, msg.id, "read")
+    # Inbox denormalization; the id guard keeps concurrent sends from moving it backwards.
+    await db.execute(
+        update(Conversation)
+        .where(
+            Conversation.id == conversation_id,
+            Conversation.last_message_id.is_(None) | (Conversation.last_message_id < msg.id),
+        )
+        .values(last_message_id=msg.id, last_activity_at=msg.created_at)
+        .execution_options(synchronize_session=False)
+    )
+
+    await db.commit()
+
+    index = get_index()
+    if index is not None:
+        # Off the loop: searches hold the index lock for a whole query, and adds may flush.
+        await run_in_threadpool(index.add, msg.id, conversation_id, msg.body)
+    return msg, recipients
+
+
+def _at_least(column, value: int):
+    return case((column.is_(None) | (column < value), value), else_=column)
+
+
+async def advance_watermarks(db: AsyncSession, conversation_id: int, user_id: int, message_id: int, status: str) -> None:
+    """Move a member's delivered (and, for "read", read) watermark forward; never backwards."""
+    values = {"last_delivered_message_id": _at_least(ConversationMember.last_delivered_message_id, message_id)}
+    if status == "read":
+        values["last_read_message_id"] = _at_least(ConversationMember.last_read_message_id, message_id)
+    await db.execute(
+        update(ConversationMember)
+        .where(ConversationMember.conversation_id == conversation_id, ConversationMember.user_id == user_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def receipt_status(member: ConversationMember, message_id: int) -> str:
+    if (member.last_read_message_id or 0) >= message_id:
+        return "read"
+    if (member.last_delivered_message_id or 0) >= message_id:
+        return "delivered"
+    return "sent"
+
+
+async def publish_new_message(message: dict[str, Any], recipients: list[int]) -> None:
+    await hub.publish(
+        {
+            "type": "message:new",
+            "conversation_id": message["conversation_id"],
+            "message": message,
+            "recipients": [message["sender_id"], *recipients],
+        }
+    )
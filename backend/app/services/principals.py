@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.user import User
+from app.services.cache import LRUCache
+from app.services.realtime import hub
+
+PRINCIPAL_KEY = "vibecheck:principal:{user_id}"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """What request handlers need to know about the caller, without an ORM session."""
+
+    id: int
+    email: str
+    display_name: str = ""
+    avatar_url: str | None = None
+    status: str = ""
+
+
+def principal_from_user(user: User) -> Principal:
+    profile = user.profile
+    return Principal(
+        id=user.id,
+        email=user.email,
+        display_name=profile.display_name if profile else "",
+        avatar_url=profile.avatar_url if profile else None,
+        status=profile.status if profile else "",
+    )
+
+
+_principals = LRUCache(settings.PRINCIPAL_CACHE_TTL_SECONDS, settings.PRINCIPAL_CACHE_SIZE)
+hub.on_control("principal:invalidate", _principals.invalidate)
+
+
+async def _load_principal(user_id: int) -> Principal | None:
+    async with AsyncSessionLocal() as db:
+        user = await db.scalar(select(User).options(selectinload(User.profile)).where(User.id == user_id))
+        return principal_from_user(user) if user else None
+
+
+async def get_principal(user_id: int) -> Principal | None:
+    """Local cache, then Redis, then the database. Unknown users are not cached."""
+    principal = _principals.get(user_id)
+    if principal is not None:
+        return principal
+
+    redis = hub.redis
+    if redis is not None:
+        try:
+            raw = await redis.get(PRINCIPAL_KEY.format(user_id=user_id))
+        except Exception:
+            raw = None
+        if raw:
+            principal = Principal(**json.loads(raw))
+            _principals.set(user_id, principal)
+            return principal
+
+    principal = await _load_principal(user_id)
+    if principal is None:
+        return None
+    _principals.set(user_id, principal)
+    if redis is not None:
+        try:
+            await redis.set(
+                PRINCIPAL_KEY.format(user_id=user_id),
+                json.dumps(asdict(principal)),
+                ex=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+            )
+        except Exception:
+            pass
+    return principal
+
+
+async def invalidate_principal(user_id: int) -> None:
+    """Call after changing a user's profile or credentials; drops every node's copy."""
+    redis = hub.redis
+    if redis is not None:
+        await redis.delete(PRINCIPAL_KEY.format(user_id=user_id))
+    await hub.broadcast_control("principal:invalidate", user_id)
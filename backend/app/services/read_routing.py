@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import time
+
+from app.core.config import settings
+from app.db.database import Replica, pick_replica, replicas
+from app.services.realtime import hub
+
+PIN_KEY = "vibecheck:pin:{user_id}"
+
+# user_id -> monotonic time until which this process reads that user's data from the primary.
+_pinned_until: dict[int, float] = {}
+
+
+async def note_write(user_id: int) -> None:
+    """Pin the user to the primary for READ_YOUR_WRITES_SECONDS (on every node, via Redis)."""
+    if not replicas:
+        return
+    _pinned_until[user_id] = time.monotonic() + settings.READ_YOUR_WRITES_SECONDS
+    redis = hub.redis
+    if redis is not None:
+        try:
+            await redis.set(PIN_KEY.format(user_id=user_id), "1", px=int(settings.READ_YOUR_WRITES_SECONDS * 1000))
+        except Exception:
+            pass
+
+
+async def _is_pinned(user_id: int) -> bool:
+    until = _pinned_until.get(user_id)
+    if until is not None:
+        if until > time.monotonic():
+            return True
+        _pinned_until.pop(user_id, None)
+    redis = hub.redis
+    if redis is not None:
+        try:
+            return bool(await redis.exists(PIN_KEY.format(user_id=user_id)))
+        except Exception:
+            return True
+    return False
+
+
+async def read_replica_for(user_id: int) -> Replica | None:
+    """The replica to serve this user's reads from, or None for the primary."""
+    if not replicas or await _is_pinned(user_id):
+        return None
+    return pick_replica()
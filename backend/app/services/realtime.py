@@ -2,8 +2,11 @@ from __future__ import annotations
 
 import asyncio
 import json
-from collections import defaultdict
-from dataclasses import dataclass
+import time
+import uuid
+from collections import defaultdict, deque
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
 from typing import Any
 
 from fastapi import WebSocket
@@ -14,93 +17,459 @@ except Exception:  # pragma: no cover
     Redis = None  # type: ignore
 
 from app.core.config import settings
+from app.services.audience import presence_audiences
+from app.services.bus import PubSubBus, StreamsBus, create_bus
+from app.services.codec import JSON, encode, json_to, with_seq
+from app.services.event_log import MemoryEventLog, RedisEventLog
+
+# Cluster routing keys:
+# - NODES_KEY: sorted set of node ids scored by last heartbeat
+# - ROUTES_KEY: per-user hash of node ids currently holding a socket for that user
+# Publishers only send an event to the bus address of nodes holding its recipients.
+NODES_KEY = "vibecheck:nodes"
+ROUTES_KEY = "vibecheck:routes:{user_id}"
+
+
+DROPPABLE_EVENT_TYPES = frozenset(t.strip() for t in settings.WS_DROPPABLE_EVENT_TYPES.split(",") if t.strip())
+
+# "Try again later": the client should reconnect once it has caught up.
+CLOSE_SEND_OVERFLOW = 1013
+
+# Routing metadata that never goes out to clients.
+_INTERNAL_KEYS = ("recipients", "seqs")
+
+
+def _client_event(event: dict[str, Any]) -> dict[str, Any]:
+    return {k: v for k, v in event.items() if k not in _INTERNAL_KEYS}
+
+
+class _Frames:
+    """One event, encoded at most once per wire format; per-user seqs are spliced in."""
+
+    def __init__(self, event: dict[str, Any], json_payload: str | None = None) -> None:
+        self._event = _client_event(event)
+        self._encoded: dict[str, str | bytes] = {JSON: json_payload} if json_payload else {}
+
+    def get(self, fmt: str, seq: int | None = None) -> str | bytes:
+        payload = self._encoded.get(fmt)
+        if payload is None:
+            payload = self._encoded[fmt] = encode(self._event, fmt)
+        return payload if seq is None else with_seq(payload, seq)
 
 
 @dataclass
 class Connection:
+    """One socket plus its bounded outbound queue, drained by a dedicated writer task."""
+
     user_id: int
     websocket: WebSocket
+    fmt: str = JSON
+    max_queue: int = settings.WS_SEND_QUEUE_SIZE
+    queue: deque[tuple[bool, str | bytes, int | None]] = field(default_factory=deque)
+    # Resume frames go out before `queue` and do not count against max_queue; they are
+    # already bounded by the event log's buffer.
+    replay: deque[str | bytes] = field(default_factory=deque)
+    writer: asyncio.Task | None = None
+    closed: bool = False
+    # While paused (resume handshake in progress) frames queue up but are not sent.
+    paused: bool = False
+
+    def __post_init__(self) -> None:
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        self.writer = asyncio.create_task(self._run_writer())
+
+    def enqueue(self, payload: str | bytes, droppable: bool = False, seq: int | None = None) -> bool:
+        """Queue a pre-encoded frame. Returns False when the connection must be dropped."""
+        if self.closed:
+            return True
+        if len(self.queue) >= self.max_queue:
+            oldest = next((i for i, (d, _, _) in enumerate(self.queue) if d), None)
+            if oldest is not None:
+                del self.queue[oldest]
+            elif droppable:
+                return True
+            else:
+                return False
+        self.queue.append((droppable, payload, seq))
+        self._wakeup.set()
+        return True
+
+    def resume(self, frames: list[str | bytes], replayed_up_to: int | None = None) -> None:
+        """Send `frames` ahead of anything queued meanwhile, skipping live frames already replayed."""
+        self.queue = deque(e for e in self.queue if replayed_up_to is None or e[2] is None or e[2] > replayed_up_to)
+        self.replay = deque(frames)
+        self.paused = False
+        self._wakeup.set()
+
+    def send_event(self, event: dict[str, Any]) -> None:
+        """Send an event to this socket only (e.g. a reply to something it sent)."""
+        if not self.enqueue(encode(event, self.fmt)):
+            asyncio.create_task(self.close(CLOSE_SEND_OVERFLOW))
+
+    async def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.replay.clear()
+        if self.writer and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _run_writer(self) -> None:
+        while not self.closed:
+            if self.paused or not (self.replay or self.queue):
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            payload = self.replay.popleft() if self.replay else self.queue.popleft()[1]
+            try:
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+            except Exception:
+                await self.close()
 
 
 class RealtimeHub:
-    def __init__(self) -> None:
-        self._connections_by_user: dict[int, set[WebSocket]] = defaultdict(set)
+    def __init__(self, node_id: str | None = None) -> None:
+        self.node_id = node_id or settings.NODE_ID or uuid.uuid4().hex
+        self._connections_by_user: dict[int, dict[WebSocket, Connection]] = defaultdict(dict)
         self._redis: Any | None = None
-        self._pubsub_task: asyncio.Task | None = None
+        self._bus: PubSubBus | StreamsBus | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        self._live_nodes: set[str] = set()
+        self._dead_nodes: set[str] = set()
+        self._route_ttl = settings.REALTIME_ROUTE_TTL_SECONDS
+        self._presence_pending: dict[int, bool] = {}
+        self._presence_online_sent: set[int] = set()
+        self._presence_task: asyncio.Task | None = None
+        self._events: MemoryEventLog | RedisEventLog = MemoryEventLog()
+        self._control_handlers: dict[str, Callable[[Any], None]] = {}
 
-    async def startup(self) -> None:
-        if settings.REDIS_URL and Redis is not None:
-            self._redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
-            self._pubsub_task = asyncio.create_task(self._run_pubsub())
+    @property
+    def redis(self) -> Any | None:
+        return self._redis
+
+    async def startup(self, redis: Any | None = None) -> None:
+        if redis is None and settings.REDIS_URL and Redis is not None:
+            redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        if redis is None:
+            return
+        self._redis = redis
+        self._events = RedisEventLog(redis)
+        # Listen before advertising the node, so nothing sent to it in between is lost.
+        self._bus = create_bus(redis, self.node_id, self._dispatch_batch)
+        await self._bus.start()
+        await self._heartbeat()
+        self._heartbeat_task = asyncio.create_task(self._run_heartbeat())
 
     async def shutdown(self) -> None:
-        if self._pubsub_task:
-            self._pubsub_task.cancel()
+        if self._bus:
+            await self._bus.stop()
+        for task in (self._heartbeat_task, self._presence_task):
+            if task:
+                task.cancel()
         if self._redis:
-            await self._redis.close()
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.zrem(NODES_KEY, self.node_id)
+            for uid in self._connections_by_user:
+                pipe.hdel(ROUTES_KEY.format(user_id=uid), self.node_id)
+            try:
+                await pipe.execute()
+            finally:
+                await self._redis.close()
 
-    async def connect(self, user_id: int, websocket: WebSocket) -> None:
-        await websocket.accept()
-        self._connections_by_user[user_id].add(websocket)
-        await self.broadcast_presence(user_id, online=True)
+    async def connect(
+        self,
+        user_id: int,
+        websocket: WebSocket,
+        resume_from: int | None = None,
+        fmt: str = JSON,
+        subprotocol: str | None = None,
+    ) -> Connection:
+        await websocket.accept(subprotocol=subprotocol)
+        first = not self._connections_by_user.get(user_id)
+        conn = Connection(user_id=user_id, websocket=websocket, fmt=fmt, paused=True)
+        conn.start()
+        # Register before reading the event log so nothing published in between is lost;
+        # live frames the replay already covers are dropped in Connection.resume().
+        self._connections_by_user[user_id][websocket] = conn
+        if first:
+            await self._register_route(user_id)
+        self._mark_presence(user_id, online=True)
+
+        current, missed = await self._events.replay(user_id, resume_from)
+        if missed is None:
+            conn.resume([encode({"type": "resync", "reason": "gap", "seq": current}, fmt)])
+        else:
+            hello = encode({"type": "session", "seq": current, "resumed": resume_from is not None}, fmt)
+            replay = [json_to(frame, fmt) for _, frame in missed]
+            conn.resume([hello, *replay], current if resume_from is not None else None)
+        return conn
 
     async def disconnect(self, user_id: int, websocket: WebSocket) -> None:
-        self._connections_by_user[user_id].discard(websocket)
-        if not self._connections_by_user[user_id]:
+        conns = self._connections_by_user.get(user_id)
+        if conns is None:
+            return
+        conn = conns.pop(websocket, None)
+        if conn and conn.writer:
+            conn.closed = True
+            conn.writer.cancel()
+        if not conns:
             self._connections_by_user.pop(user_id, None)
-            await self.broadcast_presence(user_id, online=False)
+            await self._unregister_route(user_id)
+            self._mark_presence(user_id, online=False)
 
     async def send_to_user(self, user_id: int, event: dict[str, Any]) -> None:
-        payload = json.dumps(event)
-        for ws in list(self._connections_by_user.get(user_id, [])):
-            try:
-                await ws.send_text(payload)
-            except Exception:
-                self._connections_by_user[user_id].discard(ws)
+        self._enqueue(user_id, _Frames(event), event.get("type") in DROPPABLE_EVENT_TYPES)
+
+    def _enqueue(self, user_id: int, frames: _Frames, droppable: bool, seq: int | None = None) -> None:
+        for conn in list(self._connections_by_user.get(user_id, {}).values()):
+            if not conn.enqueue(frames.get(conn.fmt, seq), droppable, seq):
+                # A slow consumer overflowed on a non-droppable event; cut it loose
+                # rather than stall or silently lose messages.
+                asyncio.create_task(conn.close(CLOSE_SEND_OVERFLOW))
 
     async def publish(self, event: dict[str, Any]) -> None:
+        recipients = event.get("recipients")
+        if not isinstance(recipients, list):
+            return
+
+        payload: str | None = None
+        if event.get("type") not in DROPPABLE_EVENT_TYPES:
+            # Sequence durable events per recipient so reconnecting clients can resume.
+            payload = json.dumps(_client_event(event))
+            user_ids = [uid for uid in dict.fromkeys(recipients) if isinstance(uid, int)]
+            seqs = await self._events.append(user_ids, payload)
+            event = {**event, "seqs": {str(uid): seq for uid, seq in seqs.items()}}
+
+        if not self._redis:
+            await self._dispatch_event(event, payload)
+            return
+
+        assert self._bus is not None
+        seqs_by_user = event.get("seqs") or {}
+        sends = []
+        for node_id, node_recipients in (await self._route(recipients)).items():
+            routed = {**event, "recipients": node_recipients}
+            if seqs_by_user:
+                routed["seqs"] = {str(uid): seqs_by_user[str(uid)] for uid in node_recipients}
+            if node_id == self.node_id:
+                # Local recipients skip the Redis round trip entirely.
+                await self._dispatch_event(routed, payload)
+            else:
+                sends.append(self._bus.send(node_id, routed))
+        if sends:
+            await asyncio.gather(*sends)
+
+    async def _route(self, recipients: list[Any]) -> dict[str, list[int]]:
+        """Group recipients by the live nodes that currently hold a socket for them."""
+        assert self._redis is not None
+        user_ids = [uid for uid in dict.fromkeys(recipients) if isinstance(uid, int)]
+        pipe = self._redis.pipeline(transaction=False)
+        for uid in user_ids:
+            pipe.hkeys(ROUTES_KEY.format(user_id=uid))
+        routes = dict(zip(user_ids, await pipe.execute()))
+        unknown = {n for nodes in routes.values() for n in nodes} - self._live_nodes - self._dead_nodes
+        unknown.discard(self.node_id)
+        if unknown:
+            # Either a node that started since our last heartbeat or a dead one.
+            await self._check_nodes(unknown)
+        by_node: dict[str, list[int]] = defaultdict(list)
+        for uid, nodes in routes.items():
+            for node_id in nodes:
+                if node_id == self.node_id or node_id in self._live_nodes:
+                    by_node[node_id].append(uid)
+        return by_node
+
+    async def _check_nodes(self, node_ids: set[str]) -> None:
+        assert self._redis is not None
+        pipe = self._redis.pipeline(transaction=False)
+        for node_id in node_ids:
+            pipe.zscore(NODES_KEY, node_id)
+        cutoff = time.time() - self._route_ttl
+        for node_id, seen in zip(node_ids, await pipe.execute()):
+            if seen is not None and seen >= cutoff:
+                self._live_nodes.add(node_id)
+            else:
+                self._dead_nodes.add(node_id)
+
+    async def _register_route(self, user_id: int) -> None:
+        if not self._redis:
+            return
+        key = ROUTES_KEY.format(user_id=user_id)
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hset(key, self.node_id, 1)
+        pipe.expire(key, self._route_ttl)
+        await pipe.execute()
+
+    async def _unregister_route(self, user_id: int) -> None:
         if self._redis:
-            await self._redis.publish("vibecheck:events", json.dumps(event))
-        else:
-            await self._dispatch_event(event)
+            await self._redis.hdel(ROUTES_KEY.format(user_id=user_id), self.node_id)
+
+    async def _heartbeat(self) -> None:
+        assert self._redis is not None
+        now = time.time()
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.zadd(NODES_KEY, {self.node_id: now})
+        pipe.zremrangebyscore(NODES_KEY, "-inf", now - self._route_ttl)
+        pipe.zrange(NODES_KEY, 0, -1)
+        # Re-assert our routes so they outlive the TTL while sockets stay open.
+        for uid in self._connections_by_user:
+            key = ROUTES_KEY.format(user_id=uid)
+            pipe.hset(key, self.node_id, 1)
+            pipe.expire(key, self._route_ttl)
+        results = await pipe.execute()
+        self._live_nodes = set(results[2])
+        self._dead_nodes = set()
+
+    async def _run_heartbeat(self) -> None:
+        interval = max(1, self._route_ttl // 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                continue
 
-    async def _dispatch_event(self, event: dict[str, Any]) -> None:
+    async def _dispatch_event(self, event: dict[str, Any], payload: str | None = None) -> None:
         # Minimum routing: allow server to specify recipients, else no-op.
         recipients = event.get("recipients")
-        if isinstance(recipients, list):
-            for uid in recipients:
-                if isinstance(uid, int):
-                    await self.send_to_user(uid, event)
+        if not isinstance(recipients, list):
+            return
+        # Encode once per event and wire format; each connection's writer task does the
+        # actual send, so a slow socket never delays the others.
+        frames = _Frames(event, payload)
+        droppable = event.get("type") in DROPPABLE_EVENT_TYPES
+        seqs = event.get("seqs") or {}
+        for uid in recipients:
+            if isinstance(uid, int):
+                self._enqueue(uid, frames, droppable, seqs.get(str(uid)))
 
-    async def _run_pubsub(self) -> None:
-        assert self._redis is not None
-        pubsub = self._redis.pubsub()
-        await pubsub.subscribe("vibecheck:events")
-        async for message in pubsub.listen():
-            if message.get("type") != "message":
-                continue
-            data = message.get("data")
+    async def _dispatch_batch(self, events: list[dict[str, Any]]) -> None:
+        for event in events:
+            if event.get("type") == "control":
+                self._apply_control(event.get("control"), event.get("data"))
+            else:
+                await self._dispatch_event(event)
+
+    def on_control(self, kind: str, handler: Callable[[Any], None]) -> None:
+        """Register a handler for node-to-node control events (e.g. cache invalidation)."""
+        self._control_handlers[kind] = handler
+
+    def _apply_control(self, kind: Any, data: Any) -> None:
+        handler = self._control_handlers.get(kind)
+        if handler:
+            handler(data)
+
+    async def broadcast_control(self, kind: str, data: Any) -> None:
+        """Apply a control event on this node and send it to every other live node."""
+        self._apply_control(kind, data)
+        if not self._redis:
+            return
+        assert self._bus is not None
+        # Read the node set now rather than at the last heartbeat: a node that started
+        # since then is already serving requests from its caches.
+        nodes = await self._redis.zrangebyscore(NODES_KEY, time.time() - self._route_ttl, "+inf")
+        event = {"type": "control", "control": kind, "data": data}
+        sends = [self._bus.send(node_id, event) for node_id in nodes if node_id != self.node_id]
+        if sends:
+            await asyncio.gather(*sends)
+
+    def _mark_presence(self, user_id: int, online: bool) -> None:
+        self._presence_pending[user_id] = online
+        if self._presence_task is None or self._presence_task.done():
+            self._presence_task = asyncio.create_task(self._flush_presence_later())
+
+    async def _flush_presence_later(self) -> None:
+        # Changes that arrive while a flush is awaiting Redis or the database go out in
+        # the next round; _mark_presence doesn't start a task while this one runs.
+        while self._presence_pending:
+            await asyncio.sleep(settings.PRESENCE_DEBOUNCE_SECONDS)
+            pending, self._presence_pending = self._presence_pending, {}
             try:
-                event = json.loads(data)
+                await self.broadcast_presence(pending)
             except Exception:
-                continue
-            await self._dispatch_event(event)
-
-    async def broadcast_presence(self, user_id: int, online: bool) -> None:
-        # For MVP, broadcast to everyone currently connected (not just contacts).
-        recipients = list(self._connections_by_user.keys())
-        await self.publish(
-            {
-                "type": "presence:update",
-                "user_id": user_id,
-                "online": online,
-                "recipients": recipients,
-            }
-        )
+                pass
+
+    async def broadcast_presence(self, changes: dict[int, bool]) -> None:
+        """Publish coalesced presence changes to each user's contact/conversation audience."""
+        still_online = await self.online_user_ids([uid for uid, online in changes.items() if not online])
+        updates: dict[int, bool] = {}
+        for uid, online in changes.items():
+            if online and uid not in self._presence_online_sent:
+                self._presence_online_sent.add(uid)
+                updates[uid] = True
+            elif not online and uid in self._presence_online_sent and uid not in still_online:
+                self._presence_online_sent.discard(uid)
+                updates[uid] = False
+        if not updates:
+            return
+
+        audiences = await presence_audiences(updates)
+
+        # Recipients seeing the same set of changes share one event. A single change
+        # is a presence:update; several (e.g. a reconnect storm) become one snapshot.
+        by_recipient: dict[int, list[tuple[int, bool]]] = defaultdict(list)
+        for uid, online in updates.items():
+            for rid in audiences.get(uid, ()):
+                by_recipient[rid].append((uid, online))
+        groups: dict[tuple[tuple[int, bool], ...], list[int]] = defaultdict(list)
+        for rid, items in by_recipient.items():
+            groups[tuple(sorted(items))].append(rid)
+        for items, recipients in groups.items():
+            if len(items) == 1:
+                uid, online = items[0]
+                await self.publish({"type": "presence:update", "user_id": uid, "online": online, "recipients": recipients})
+            else:
+                await self.publish(
+                    {
+                        "type": "presence:snapshot",
+                        "users": [{"user_id": uid, "online": online} for uid, online in items],
+                        "recipients": recipients,
+                    }
+                )
+
+        # Users who just came online get one snapshot of who in their audience is online.
+        arrived = [uid for uid, online in updates.items() if online]
+        online_peers = await self.online_user_ids({p for uid in arrived for p in audiences.get(uid, ())})
+        for uid in arrived:
+            peers = sorted(audiences.get(uid, frozenset()) & online_peers)
+            await self.publish(
+                {
+                    "type": "presence:snapshot",
+                    "users": [{"user_id": p, "online": True} for p in peers],
+                    "recipients": [uid],
+                }
+            )
+
+    async def online_user_ids(self, user_ids: Iterable[int]) -> set[int]:
+        """Subset of `user_ids` with an open socket anywhere in the cluster."""
+        user_ids = list(user_ids)
+        if not self._redis:
+            return {uid for uid in user_ids if uid in self._connections_by_user}
+        if not user_ids:
+            return set()
+        pipe = self._redis.pipeline(transaction=False)
+        for uid in user_ids:
+            pipe.exists(ROUTES_KEY.format(user_id=uid))
+        return {uid for uid, exists in zip(user_ids, await pipe.execute()) if exists}
+
+    def has_connections(self, user_id: int) -> bool:
+        """Whether this node holds an open socket for the user."""
+        return bool(self._connections_by_user.get(user_id))
 
     def connected_user_ids(self) -> list[int]:
         return list(self._connections_by_user.keys())
 
 
 hub = RealtimeHub()
-
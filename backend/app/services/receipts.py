@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.core.config import settings
+from app.services.membership import conversation_member_ids
+from app.services.realtime import hub
+
+
+class ReceiptCoalescer:
+    """Batches receipt changes per conversation into one `receipt:batch` event per window.
+
+    Opening a conversation can acknowledge many messages at once; members get a single
+    event carrying each reader's new watermarks instead of one event per message.
+    """
+
+    def __init__(self) -> None:
+        # conversation_id -> user_id -> [delivered_up_to, read_up_to]
+        self._pending: dict[int, dict[int, list[int]]] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def add(self, conversation_id: int, user_id: int, message_id: int, status: str) -> None:
+        marks = self._pending.setdefault(conversation_id, {}).setdefault(user_id, [0, 0])
+        marks[0] = max(marks[0], message_id)
+        if status == "read":
+            marks[1] = max(marks[1], message_id)
+        if conversation_id not in self._tasks:
+            self._tasks[conversation_id] = asyncio.create_task(self._flush_later(conversation_id))
+
+    async def _flush_later(self, conversation_id: int) -> None:
+        await asyncio.sleep(settings.RECEIPT_COALESCE_SECONDS)
+        self._tasks.pop(conversation_id, None)
+        pending = self._pending.pop(conversation_id, {})
+        if not pending:
+            return
+        members = await conversation_member_ids(conversation_id)
+        await hub.publish(
+            {
+                "type": "receipt:batch",
+                "conversation_id": conversation_id,
+                "receipts": [
+                    {"user_id": uid, "delivered_up_to": delivered, "read_up_to": read or None}
+                    for uid, (delivered, read) in pending.items()
+                ],
+                "recipients": list(members),
+            }
+        )
+
+
+receipt_coalescer = ReceiptCoalescer()
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import heapq
+import json
+import mmap
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.message import Message
+
+try:
+    import fcntl
+except Exception:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+# Word characters in any script; very long "words" (hashes, URLs) are not worth indexing.
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+MAX_TOKEN_LENGTH = 64
+CATCH_UP_BATCH = 5000
+# A hole in the ids (an insert still in flight, or rolled back) holds the watermark back
+# until the message after it is this old; then it is taken to be rolled back.
+GAP_SETTLE_SECONDS = 60
+
+Key = tuple[str, int]  # (token, conversation_id)
+
+
+def tokenize(text: str) -> list[str]:
+    return list(dict.fromkeys(t for t in _TOKEN_RE.findall(text.lower()) if len(t) <= MAX_TOKEN_LENGTH))
+
+
+class _Segment:
+    """An immutable on-disk run of postings.
+
+    `<name>.post` holds every posting list back to back as native uint32 and is read
+    through mmap; `<name>.terms` maps "token conversation_id" to (offset, count).
+    """
+
+    def __init__(self, directory: str, name: str) -> None:
+        self.name = name
+        self.paths = [os.path.join(directory, f"{name}.post"), os.path.join(directory, f"{name}.terms")]
+        with open(self.paths[1]) as f:
+            self._terms: dict[str, list[int]] = json.load(f)
+        self._file = open(self.paths[0], "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._raw = memoryview(self._mmap) if self._mmap else memoryview(b"")
+        self._view = self._raw.cast("I")
+
+    def postings(self, token: str, conversation_id: int) -> Sequence[int]:
+        hit = self._terms.get(f"{token} {conversation_id}")
+        if hit is None:
+            return ()
+        offset, count = hit
+        return self._view[offset : offset + count]
+
+    def items(self) -> Iterator[tuple[Key, Sequence[int]]]:
+        for key, (offset, count) in self._terms.items():
+            token, cid = key.rsplit(" ", 1)
+            yield (token, int(cid)), self._view[offset : offset + count]
+
+    def close(self) -> None:
+        self._view.release()
+        self._raw.release()
+        if self._mmap:
+            self._mmap.close()
+        self._file.close()
+
+    @staticmethod
+    def write(directory: str, name: str, postings: Iterable[tuple[Key, Sequence[int]]]) -> _Segment:
+        terms: dict[str, list[int]] = {}
+        offset = 0
+        with open(os.path.join(directory, f"{name}.post"), "wb") as f:
+            for (token, cid), ids in postings:
+                if not ids:
+                    continue
+                array("I", ids).tofile(f)
+                terms[f"{token} {cid}"] = [offset, len(ids)]
+                offset += len(ids)
+        with open(os.path.join(directory, f"{name}.terms"), "w") as f:
+            json.dump(terms, f, separators=(",", ":"))
+        return _Segment(directory, name)
+
+
+class InvertedIndex:
+    """Incremental inverted index: token -> conversation -> sorted message ids.
+
+    New postings land in an in-memory delta and are flushed to immutable mmap'd segments;
+    segments are merged once there are too many. Scoping postings per conversation means a
+    query only touches the conversations the caller belongs to.
+
+    Messages are added as they are sent on this process; anything else (other nodes, a
+    crash before a flush) is picked up from the database by `catch_up` before each query,
+    using a watermark below which every message id has been indexed (or given up on, see
+    GAP_SETTLE_SECONDS). A directory belongs to one process, enforced with a lock file;
+    run several workers or instances with a SEARCH_INDEX_DIR each.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._delta: dict[Key, array] = {}
+        self._delta_count = 0
+        self._segments: list[_Segment] = []
+        self._next_segment = 1
+        self._watermark = 0  # every message id <= watermark is indexed or settled as a gap
+        self._ahead: set[int] = set()  # indexed ids above the watermark
+        self._gaps: set[int] = set()  # settled holes below it, still indexable by add()
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, "lock"), "w")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock_file.close()
+                raise RuntimeError(f"search index {directory!r} is in use by another process") from None
+        self._load()
+
+    # -- writes -----------------------------------------------------------------------
+
+    def add(self, message_id: int, conversation_id: int, body: str) -> None:
+        tokens = tokenize(body or "")
+        with self._lock:
+            if message_id in self._ahead or (message_id <= self._watermark and message_id not in self._gaps):
+                return
+            self._gaps.discard(message_id)
+            for token in tokens:
+                insort(self._delta.setdefault((token, conversation_id), array("I")), message_id)
+            self._delta_count += len(tokens)
+            self._ahead.add(message_id)
+            if self._delta_count >= settings.SEARCH_INDEX_FLUSH_POSTINGS:
+                self._flush_locked()
+
+    def catch_up(self, db: Session) -> None:
+        """Index messages committed since the watermark (by any process).
+
+        Concurrent sends can commit out of id order, so the watermark only moves over
+        consecutive indexed ids; rows above a hole are read again on the next call until
+        the hole fills or settles.
+        """
+        settled = datetime.now(timezone.utc) - timedelta(seconds=GAP_SETTLE_SECONDS)
+        after = self._watermark
+        advancing = True
+        while True:
+            rows = db.execute(
+                select(Message.id, Message.conversation_id, Message.body, Message.created_at)
+                .where(Message.id > after)
+                .order_by(Message.id)
+                .limit(CATCH_UP_BATCH)
+            ).all()
+            for mid, cid, body, _ in rows:
+                self.add(mid, cid, body)
+            with self._lock:
+                for mid, _, _, created_at in rows:
+                    if created_at.tzinfo is None:  # SQLite hands back naive UTC
+                        created_at = created_at.replace(tzinfo=timezone.utc)
+                    advancing = advancing and (mid == self._watermark + 1 or created_at < settled)
+                    if not advancing:
+                        break
+                    if mid - self._watermark <= CATCH_UP_BATCH:
+                        self._gaps.update(range(self._watermark + 1, mid))
+                    self._watermark = max(self._watermark, mid)
+                if len(self._gaps) > CATCH_UP_BATCH:
+                    self._gaps = set(sorted(self._gaps)[-CATCH_UP_BATCH:])
+                self._ahead = {mid for mid in self._ahead if mid > self._watermark}
+            if len(rows) < CATCH_UP_BATCH:
+                return
+            after = rows[-1][0]
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._delta:
+            self._segments.append(self._new_segment(sorted(self._delta.items())))
+            self._delta, self._delta_count = {}, 0
+        if len(self._segments) > settings.SEARCH_INDEX_MAX_SEGMENTS:
+            self._compact_locked()
+        self._save_meta()
+
+    def _compact_locked(self) -> None:
+        merged = _merge(self._segments)
+        old, self._segments = self._segments, []
+        self._segments.append(self._new_segment((key, sorted(ids)) for key, ids in sorted(merged.items())))
+        self._save_meta()
+        for segment in old:
+            segment.close()
+            for path in segment.paths:
+                os.remove(path)
+
+    def _new_segment(self, postings: Iterable[tuple[Key, Sequence[int]]]) -> _Segment:
+        name = f"seg-{self._next_segment:06d}"
+        self._next_segment += 1
+        return _Segment.write(self.directory, name, postings)
+
+    # -- persistence --------------------------------------------------------------------
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def _save_meta(self) -> None:
+        # Only called right after a flush, so the watermark and `ahead` describe segment contents.
+        meta = {
+            "segments": [s.name for s in self._segments],
+            "next_segment": self._next_segment,
+            "watermark": self._watermark,
+            "ahead": sorted(self._ahead),
+        }
+        tmp = self._meta_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path())
+
+    def _load(self) -> None:
+        try:
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return
+        self._segments = [_Segment(self.directory, name) for name in meta["segments"]]
+        self._next_segment = meta["next_segment"]
+        self._watermark = meta["watermark"]
+        self._ahead = set(meta["ahead"])
+
+    # -- reads --------------------------------------------------------------------------
+
+    def _sources(self, token: str, conversation_id: int) -> list[Sequence[int]]:
+        sources = [s.postings(token, conversation_id) for s in self._segments]
+        delta = self._delta.get((token, conversation_id))
+        if delta:
+            sources.append(delta)
+        return [s for s in sources if len(s)]
+
+    def search(self, query: str, conversation_ids: Iterable[int], before_id: int | None, limit: int) -> list[int]:
+        """Ids of messages containing every token of `query`, newest first."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        upper = before_id if before_id is not None else 2**32
+        with self._lock:
+            per_conversation = []
+            for cid in conversation_ids:
+                postings = {t: self._sources(t, cid) for t in tokens}
+                if any(not sources for sources in postings.values()):
+                    continue
+                # Walk the rarest token's postings newest-first and probe the others.
+                rarest = min(tokens, key=lambda t: sum(len(s) for s in postings[t]))
+                others = [postings[t] for t in tokens if t != rarest]
+                per_conversation.append(self._matches(postings[rarest], others, upper, limit))
+            out: list[int] = []
+            last = None
+            for mid in heapq.merge(*per_conversation, reverse=True):
+                if mid != last:
+                    out.append(mid)
+                    last = mid
+                if len(out) >= limit:
+                    break
+            return out
+
+    @staticmethod
+    def _matches(primary: list[Sequence[int]], others: list[list[Sequence[int]]], upper: int, limit: int) -> list[int]:
+        def descending(seq: Sequence[int]) -> Iterator[int]:
+            for i in range(bisect_left(seq, upper) - 1, -1, -1):
+                yield seq[i]
+
+        def contains(sources: list[Sequence[int]], mid: int) -> bool:
+            for seq in sources:
+                i = bisect_left(seq, mid)
+                if i < len(seq) and seq[i] == mid:
+                    return True
+            return False
+
+        found: list[int] = []
+        last = None
+        for mid in heapq.merge(*(descending(s) for s in primary), reverse=True):
+            if mid == last:
+                continue
+            last = mid
+            if all(contains(sources, mid) for sources in others):
+                found.append(mid)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+def _merge(segments: list[_Segment]) -> dict[Key, set[int]]:
+    # Kept separate so no view into a segment outlives the merge (closing it would fail).
+    merged: dict[Key, set[int]] = {}
+    for segment in segments:
+        for key, ids in segment.items():
+            merged.setdefault(key, set()).update(ids)
+    return merged
+
+
+_index: InvertedIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> InvertedIndex | None:
+    """The process-wide index when SEARCH_BACKEND=inverted, else None."""
+    global _index
+    if settings.SEARCH_BACKEND != "inverted":
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = InvertedIndex(settings.SEARCH_INDEX_DIR)
+    return _index
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from app.core.config import settings
+from app.services.membership import conversation_member_ids
+from app.services.realtime import hub
+
+
+class TypingTracker:
+    """Server-side typing state per (user, conversation).
+
+    Clients may send typing:start on every keystroke; only the first start in each
+    throttle window is broadcast, and a stop is sent automatically when starts dry up.
+    Recipients are the conversation's members, never the client's say-so.
+    """
+
+    def __init__(self) -> None:
+        self._last_start: dict[tuple[int, int], float] = {}
+        self._expiry: dict[tuple[int, int], asyncio.TimerHandle] = {}
+
+    async def start(self, user_id: int, conversation_id: int) -> None:
+        members = await conversation_member_ids(conversation_id)
+        if user_id not in members:
+            return
+        key = (user_id, conversation_id)
+        now = time.monotonic()
+        if now - self._last_start.get(key, float("-inf")) >= settings.TYPING_THROTTLE_SECONDS:
+            self._last_start[key] = now
+            await self._publish("typing:start", user_id, conversation_id, members)
+
+        timer = self._expiry.pop(key, None)
+        if timer:
+            timer.cancel()
+        self._expiry[key] = asyncio.get_running_loop().call_later(
+            settings.TYPING_TIMEOUT_SECONDS,
+            lambda: asyncio.create_task(self.stop(user_id, conversation_id)),
+        )
+
+    async def stop(self, user_id: int, conversation_id: int) -> None:
+        key = (user_id, conversation_id)
+        timer = self._expiry.pop(key, None)
+        if timer:
+            timer.cancel()
+        if self._last_start.pop(key, None) is None:
+            return  # never announced, nothing to retract
+        members = await conversation_member_ids(conversation_id)
+        await self._publish("typing:stop", user_id, conversation_id, members)
+
+    async def clear_user(self, user_id: int) -> None:
+        for uid, cid in [key for key in self._last_start if key[0] == user_id]:
+            await self.stop(uid, cid)
+
+    async def _publish(self, etype: str, user_id: int, conversation_id: int, members: frozenset[int]) -> None:
+        await hub.publish(
+            {
+                "type": etype,
+                "conversation_id": conversation_id,
+                "user_id": user_id,
+                "recipients": [uid for uid in members if uid != user_id],
+            }
+        )
+
+
+typing_tracker = TypingTracker()
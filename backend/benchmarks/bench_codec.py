@@ -0,0 +1,86 @@
+"""Encode CPU and wire bytes of realtime events: JSON vs MessagePack.
+
+    python benchmarks/bench_codec.py [--iterations 20000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.codec import JSON, MSGPACK, encode, msgpack_available, with_seq  # noqa: E402
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc).isoformat()
+
+EVENTS = {
+    "typing:start": {"type": "typing:start", "conversation_id": 4182, "user_id": 93},
+    "message:new (text)": {
+        "type": "message:new",
+        "conversation_id": 4182,
+        "message": {
+            "id": 18342211,
+            "conversation_id": 4182,
+            "sender_id": 93,
+            "body": "Running ten minutes late, grab a table and order me the usual?",
+            "created_at": NOW,
+            "attachments": [],
+        },
+    },
+    "message:new (2 attachments)": {
+        "type": "message:new",
+        "conversation_id": 4182,
+        "message": {
+            "id": 18342212,
+            "conversation_id": 4182,
+            "sender_id": 93,
+            "body": "photos from saturday",
+            "created_at": NOW,
+            "attachments": [
+                {
+                    "id": 55120 + i,
+                    "kind": "image",
+                    "url": f"https://cdn.example.com/u/93/{i}.jpg",
+                    "mime_type": "image/jpeg",
+                    "size": 482113,
+                }
+                for i in range(2)
+            ],
+        },
+    },
+    "receipt:batch (20 members)": {
+        "type": "receipt:batch",
+        "conversation_id": 4182,
+        "receipts": [{"user_id": 100 + i, "delivered_up_to": 18342212, "read_up_to": 18342200 + i} for i in range(20)],
+    },
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    if not msgpack_available():
+        sys.exit("msgpack is not installed")
+
+    print(f"{'event':30} {'json B':>7} {'msgpack B':>9} {'json us':>8} {'msgpack us':>10} {'seq splice us (json/mp)':>24}")
+    for name, event in EVENTS.items():
+        row = [name]
+        for fmt in (JSON, MSGPACK):
+            payload = encode(event, fmt)
+            row.append(len(payload.encode() if isinstance(payload, str) else payload))
+        for fmt in (JSON, MSGPACK):
+            row.append(min(timeit.repeat(lambda: encode(event, fmt), number=args.iterations, repeat=3)) / args.iterations * 1e6)
+        splice = []
+        for fmt in (JSON, MSGPACK):
+            payload = encode(event, fmt)
+            splice.append(min(timeit.repeat(lambda: with_seq(payload, 12345), number=args.iterations, repeat=3)) / args.iterations * 1e6)
+        print(f"{row[0]:30} {row[1]:7d} {row[2]:9d} {row[3]:8.2f} {row[4]:10.2f} {splice[0]:11.2f} / {splice[1]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Deep history paging: keyset cursor vs OFFSET, on a seeded conversation.
+
+    DATABASE_URL=... python benchmarks/bench_history.py [--messages 1000000] [--page 50]
+
+Seeds one conversation with `--messages` messages (removed again afterwards) and times
+fetching a page at increasing depths the way /messages/conversation/{id}/page does
+(`id < cursor ORDER BY id DESC LIMIT n`) against `OFFSET depth`. Point it at a scratch
+database.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import delete, insert, select, text  # noqa: E402
+
+from app.db.database import SessionLocal, engine  # noqa: E402
+from app.models.conversation import Conversation  # noqa: E402
+from app.models.message import Message  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+SEED_BATCH = 50_000
+
+
+def seed(db, conversation_id: int, sender_id: int, count: int) -> None:
+    if engine.dialect.name == "postgresql":
+        db.execute(
+            text(
+                "INSERT INTO messages (conversation_id, sender_id, body) "
+                "SELECT :c, :s, 'seeded message ' || g FROM generate_series(1, :n) AS g"
+            ),
+            {"c": conversation_id, "s": sender_id, "n": count},
+        )
+        db.execute(text("ANALYZE messages"))
+    else:
+        for start in range(0, count, SEED_BATCH):
+            rows = [
+                {"conversation_id": conversation_id, "sender_id": sender_id, "body": f"seeded message {i}"}
+                for i in range(start, min(start + SEED_BATCH, count))
+            ]
+            db.execute(insert(Message), rows)
+    db.commit()
+
+
+def timed(db, query, repeat: int = 5) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.execute(query).all()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=50)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        user = User(email=f"bench-{time.time_ns()}@example.invalid", password_hash="x")
+        conv = Conversation(type="group", title="history benchmark")
+        db.add_all([user, conv])
+        db.commit()
+        try:
+            started = time.perf_counter()
+            seed(db, conv.id, user.id, args.messages)
+            print(f"seeded {args.messages} messages in {time.perf_counter() - started:.1f}s ({engine.dialect.name})")
+
+            ids = db.scalars(
+                select(Message.id).where(Message.conversation_id == conv.id).order_by(Message.id.desc())
+            ).all()
+            base = select(Message.id, Message.sender_id, Message.body, Message.created_at).where(
+                Message.conversation_id == conv.id
+            )
+            print(f"{'depth':>10} {'keyset ms':>10} {'offset ms':>10}")
+            depth = 0
+            while depth < args.messages:
+                keyset = base.order_by(Message.id.desc()).limit(args.page)
+                if depth:
+                    keyset = keyset.where(Message.id < ids[depth - 1])
+                offset = base.order_by(Message.id.desc()).offset(depth).limit(args.page)
+                print(f"{depth:>10} {timed(db, keyset):>10.2f} {timed(db, offset):>10.2f}")
+                depth = depth * 10 if depth else args.page
+        finally:
+            db.rollback()
+            db.execute(delete(Message).where(Message.conversation_id == conv.id))
+            db.execute(delete(Conversation).where(Conversation.id == conv.id))
+            db.execute(delete(User).where(User.id == user.id))
+            db.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Per-page CPU of a message history response: response_model vs FastJSONResponse.
+
+    python benchmarks/bench_serialize.py [--messages 200] [--attachments 2] [--iterations 200]
+
+The response_model path is what the history endpoints did before returning
+FastJSONResponse: build MessageOut models, then let FastAPI validate and encode them
+against the route's response_model (serialize_response) into a JSONResponse.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+import app.models  # noqa: E402,F401  (registers every mapper)
+from app.core import responses  # noqa: E402
+from app.core.responses import FastJSONResponse  # noqa: E402
+from app.models.attachment import Attachment  # noqa: E402
+from app.models.message import Message  # noqa: E402
+from app.schemas.chat import MessageOut, MessagePage  # noqa: E402
+from app.services.message_service import message_dict  # noqa: E402
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def make_page(count: int, attachments: int) -> list[Message]:
+    msgs = []
+    for i in range(count):
+        mid = 18_000_000 + i
+        msgs.append(
+            Message(
+                id=mid,
+                conversation_id=4182,
+                sender_id=90 + i % 4,
+                body=f"message {i}: running ten minutes late, grab a table and order me the usual?",
+                created_at=START + timedelta(seconds=i),
+                attachments=[
+                    Attachment(
+                        id=mid * 10 + j,
+                        message_id=mid,
+                        kind="image",
+                        url=f"https://cdn.example.com/u/93/{mid}-{j}.jpg",
+                        mime_type="image/jpeg",
+                        size=482113,
+                    )
+                    for j in range(attachments)
+                ],
+            )
+        )
+    return msgs
+
+
+async def response_model_path(msgs: list[Message], field) -> bytes:
+    page = MessagePage(items=[MessageOut(**message_dict(m)) for m in msgs], next_cursor="eyJpZCI6MTh9")
+    content = await serialize_response(field=field, response_content=page, is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def fast_path(msgs: list[Message], field) -> bytes:
+    return FastJSONResponse({"items": [message_dict(m) for m in msgs], "next_cursor": "eyJpZCI6MTh9"}).body
+
+
+async def best_ms(fn, msgs: list[Message], iterations: int) -> tuple[float, int]:
+    field = create_model_field("Response_page", MessagePage, mode="serialization")
+    size = len(await fn(msgs, field))
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await fn(msgs, field)
+        best = min(best, (time.perf_counter() - started) / iterations)
+    return best * 1e3, size
+
+
+async def run(args: argparse.Namespace) -> None:
+    msgs = make_page(args.messages, args.attachments)
+    print(f"{args.messages} messages, {args.attachments} attachments each")
+    print(f"{'path':32} {'ms/page':>8} {'bytes':>7}")
+    ms, size = await best_ms(response_model_path, msgs, args.iterations)
+    print(f"{'MessageOut + response_model':32} {ms:8.2f} {size:7d}")
+    ms, size = await best_ms(fast_path, msgs, args.iterations)
+    print(f"{'FastJSONResponse':32} {ms:8.2f} {size:7d}")
+    orjson, responses.orjson = responses.orjson, None
+    try:
+        ms, size = await best_ms(fast_path, msgs, args.iterations)
+    finally:
+        responses.orjson = orjson
+    print(f"{'FastJSONResponse (stdlib json)':32} {ms:8.2f} {size:7d}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--attachments", type=int, default=2)
+    parser.add_argument("--iterations", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,9 @@ def _run(cmd: list[str]) -> None:
 def main() -> None:
     # Run migrations (best-effort). Railway sets DATABASE_URL.
     _run([sys.executable, "-m", "alembic", "upgrade", "head"])
+    # Keep empty message partitions ahead of the id sequence. Not fatal: there is room
+    # for MESSAGE_PARTITIONS_AHEAD partitions' worth of messages, and every start retries.
+    subprocess.run([sys.executable, "-m", "app.db.partitions", "ensure"], check=False)
 
     port = os.getenv("PORT", "8000")
     _run([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "0.0.0.0", "--port", port])
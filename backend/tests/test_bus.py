@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+from fakeredis.aioredis import FakeRedis  # noqa: E402
+
+from app.services.bus import NODE_STREAM, StreamsBus  # noqa: E402
+
+
+def test_streams_bus_survives_stream_expiry_and_handler_errors() -> None:
+    async def scenario() -> None:
+        redis = FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        received: list[dict] = []
+
+        async def handler(events):
+            if any(e.get("boom") for e in events):
+                raise RuntimeError("bad batch")
+            received.extend(events)
+
+        bus = StreamsBus(redis, "n1", handler)
+        await bus.start()
+        try:
+            await bus.send("n1", {"boom": True})
+            await asyncio.sleep(0.2)
+            await bus.send("n1", {"a": 1})
+            # What EXPIRE does to an idle stream: the group goes with it.
+            for _ in range(50):
+                if received:
+                    break
+                await asyncio.sleep(0.05)
+            await redis.delete(NODE_STREAM.format(node_id="n1"))
+            await bus.send("n1", {"a": 2})
+            for _ in range(100):
+                if len(received) == 2:
+                    break
+                await asyncio.sleep(0.05)
+            assert received == [{"a": 1}, {"a": 2}]
+        finally:
+            await bus.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+from app.services import event_log
+from app.services.event_log import MemoryEventLog
+
+
+def test_memory_log_drops_users_idle_past_the_ttl(monkeypatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(event_log, "time", SimpleNamespace(monotonic=lambda: now[0]))
+
+    async def scenario() -> None:
+        log = MemoryEventLog(size=10, ttl=60)
+        await log.append([1, 2], '{"type":"x"}')
+        now[0] += 30
+        await log.append([2], '{"type":"x"}')
+        now[0] += 45  # user 1 idle for 75s, user 2 for 45s
+        await log.append([3], '{"type":"x"}')
+        assert set(log._ring) == {2, 3}
+        assert await log.replay(1, 1) == (0, None)  # behind a reset log: resync
+        current, frames = await log.replay(2, 1)
+        assert current == 2 and [seq for seq, _ in frames] == [2]
+
+    asyncio.run(scenario())
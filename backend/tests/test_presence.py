@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.core.config import settings
+from app.services import realtime
+from app.services.realtime import RealtimeHub
+
+
+def test_presence_change_during_a_flush_is_sent(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "PRESENCE_DEBOUNCE_SECONDS", 0.05)
+    loaded: list[set[int]] = []
+
+    async def slow_audiences(updates):
+        loaded.append(set(updates))
+        await asyncio.sleep(0.3)
+        return {}
+
+    monkeypatch.setattr(realtime, "presence_audiences", slow_audiences)
+
+    async def scenario() -> None:
+        hub = RealtimeHub(node_id="n1")
+        hub._mark_presence(1, online=True)
+        await asyncio.sleep(0.1)  # the flush for user 1 is now loading audiences
+        hub._mark_presence(2, online=True)
+        await asyncio.sleep(1.0)
+        assert loaded == [{1}, {2}]
+        assert hub._presence_pending == {}
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+from app.core.config import settings
+from app.services.realtime import RealtimeHub
+
+
+class SlowWebSocket:
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+        self.closed: int | None = None
+
+    async def accept(self, subprotocol=None) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        await asyncio.sleep(0.001)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed = code
+
+
+def test_long_replay_does_not_overflow_the_live_queue() -> None:
+    missed = settings.WS_SEND_QUEUE_SIZE + 50
+
+    async def scenario() -> None:
+        hub = RealtimeHub(node_id="a")
+        for i in range(missed):
+            await hub.publish({"type": "message:new", "i": i, "recipients": [1]})
+        ws = SlowWebSocket()
+        await hub.connect(1, ws, resume_from=0)
+        await asyncio.sleep(0.01)
+        await hub.publish({"type": "message:new", "i": "live", "recipients": [1]})
+        for _ in range(200):
+            if len(ws.sent) == missed + 2:
+                break
+            await asyncio.sleep(0.05)
+
+        assert ws.closed is None
+        assert ws.sent[0]["type"] == "session"
+        assert [e["i"] for e in ws.sent[1:]] == [*range(missed), "live"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+from fakeredis.aioredis import FakeRedis  # noqa: E402
+
+from app.services.realtime import RealtimeHub  # noqa: E402
+
+
+class FakeWebSocket:
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+
+    async def accept(self, subprotocol=None) -> None:
+        pass
+
+    async def send_text(self, text: str) -> None:
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+def test_events_only_go_to_nodes_holding_recipients() -> None:
+    async def scenario() -> None:
+        server = fakeredis.FakeServer()
+        hubs = [RealtimeHub(node_id=f"n{i}") for i in range(3)]
+        for hub in hubs:
+            await hub.startup(FakeRedis(server=server, decode_responses=True))
+
+        sockets = {}
+        for uid, node in [(1, 0), (2, 1), (3, 2), (4, 2)]:
+            sockets[uid] = FakeWebSocket()
+            await hubs[node].connect(uid, sockets[uid])
+
+        sent: list[tuple[str, list[int]]] = []
+        send = hubs[0]._bus.send
+
+        async def recording_send(node_id, event):
+            sent.append((node_id, event["recipients"]))
+            await send(node_id, event)
+
+        hubs[0]._bus.send = recording_send
+        try:
+            await hubs[0].publish({"type": "message:new", "body": "hi", "recipients": [1, 2, 3]})
+            await asyncio.sleep(0.3)
+
+            # One bus send per remote node that holds a recipient, carrying only its users.
+            assert sorted(sent) == [("n1", [2]), ("n2", [3])]
+            for uid in (1, 2, 3):
+                assert [e["body"] for e in sockets[uid].sent if e["type"] == "message:new"] == ["hi"]
+            assert not [e for e in sockets[4].sent if e["type"] == "message:new"]
+        finally:
+            for hub in hubs:
+                await hub.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_control_events_reach_nodes_started_after_the_last_heartbeat() -> None:
+    async def scenario() -> None:
+        server = fakeredis.FakeServer()
+        a, b = RealtimeHub(node_id="a"), RealtimeHub(node_id="b")
+        await a.startup(FakeRedis(server=server, decode_responses=True))
+        await b.startup(FakeRedis(server=server, decode_responses=True))
+        received: list[int] = []
+        b.on_control("members:invalidate", received.append)
+        try:
+            assert a._live_nodes == {"a"}  # a has not heartbeated since b started
+            await a.broadcast_control("members:invalidate", 42)
+            await asyncio.sleep(0.3)
+            assert received == [42]
+        finally:
+            await a.shutdown()
+            await b.shutdown()
+
+    asyncio.run(scenario())
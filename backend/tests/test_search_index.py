@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import app.models  # noqa: F401  (registers every table)
+from app.db.base import Base
+from app.models.message import Message
+from app.services import search_index
+from app.services.search_index import InvertedIndex, _Segment
+
+
+def _send(db: Session, mid: int, body: str) -> None:
+    db.add(Message(id=mid, conversation_id=1, sender_id=1, body=body))
+    db.commit()
+
+
+def test_out_of_order_commits_are_not_lost(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    Base.metadata.create_all(engine)
+    index = InvertedIndex(str(tmp_path / "index"))
+    with Session(engine) as db:
+        _send(db, 1, "first")
+        _send(db, 3, "banana")  # 2 is still in flight
+        index.catch_up(db)
+        _send(db, 2, "apple")
+        index.add(2, 1, "apple")  # create_message's add, after a search moved on
+        index.catch_up(db)
+        assert index.search("apple", [1], None, 10) == [2]
+        assert index.search("banana", [1], None, 10) == [3]
+        assert index._watermark == 3
+
+
+def test_settled_gap_releases_watermark_but_stays_indexable(tmp_path, monkeypatch) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    Base.metadata.create_all(engine)
+    index = InvertedIndex(str(tmp_path / "index"))
+    with Session(engine) as db:
+        _send(db, 1, "first")
+        _send(db, 3, "banana")
+        index.catch_up(db)
+        assert index._watermark == 1
+        monkeypatch.setattr(search_index, "GAP_SETTLE_SECONDS", -60)
+        index.catch_up(db)
+        assert index._watermark == 3
+        _send(db, 2, "apple")  # a very late commit
+        index.add(2, 1, "apple")
+        assert index.search("apple", [1], None, 10) == [2]
+
+
+def test_directory_is_locked_to_one_index(tmp_path) -> None:
+    first = InvertedIndex(str(tmp_path / "index"))
+    with pytest.raises(RuntimeError):
+        InvertedIndex(str(tmp_path / "index"))
+    assert first.search("anything", [1], None, 10) == []
+
+
+def test_empty_segment_opens(tmp_path) -> None:
+    segment = _Segment.write(str(tmp_path), "seg-000001", [(("word", 1), [])])
+    assert list(segment.postings("word", 1)) == []
+    segment.close()
@@ -15,6 +15,12 @@ export type Conversation = {
   member_user_ids: number[];
 };
 
+export type InboxItem = Conversation & {
+  last_message?: { id: number; sender_id: number; body: string; created_at: string } | null;
+  last_activity_at: string;
+  unread_count: number;
+};
+
 export type Attachment = {
   id: number;
   kind: string;
@@ -47,6 +53,11 @@ export async function listConversations() {
   return data as Conversation[];
 }
 
+export async function getInbox(cursor?: string, limit = 50) {
+  const { data } = await api.get("/conversations/inbox", { params: { cursor, limit } });
+  return data as { items: InboxItem[]; next_cursor: string | null };
+}
+
 export async function createConversation(type: "direct" | "group", member_user_ids: number[], title?: string) {
   const { data } = await api.post("/conversations", { type, member_user_ids, title: title ?? null });
   return data as Conversation;
@@ -7,20 +7,35 @@ const wsBase =
 
 export type WsEvent =
   | { type: "message:new"; conversation_id: number; message: any }
-  | { type: "receipt:update"; conversation_id: number; message_id: number; user_id: number; status: string }
+  | {
+      type: "receipt:batch";
+      conversation_id: number;
+      receipts: { user_id: number; delivered_up_to: number; read_up_to: number | null }[];
+    }
   | { type: "typing:start" | "typing:stop"; conversation_id?: number; user_id: number }
   | { type: "presence:update"; user_id: number; online: boolean }
+  | { type: "presence:snapshot"; users: { user_id: number; online: boolean }[] }
+  | { type: "session"; seq: number; resumed: boolean }
+  | { type: "resync"; reason: string; seq: number }
+  | { type: "message:ack"; client_id?: string; message_id: number; message: any }
+  | { type: "message:error"; client_id?: string; detail: string }
   | { type: string; [k: string]: any };
 
+// Last per-user event sequence seen; lets a reconnect resume instead of refetching.
+let lastSeq: number | null = null;
+
 export function connectWs(onEvent: (e: WsEvent) => void) {
   const token = useAuthStore.getState().token;
   if (!token) throw new Error("Not authenticated");
 
-  const ws = new WebSocket(`${wsBase}/api/v1/ws?token=${encodeURIComponent(token)}`);
+  const resume = lastSeq !== null ? `&resume_from=${lastSeq}` : "";
+  const ws = new WebSocket(`${wsBase}/api/v1/ws?token=${encodeURIComponent(token)}${resume}`);
 
   ws.onmessage = (msg) => {
     try {
-      onEvent(JSON.parse(msg.data));
+      const e = JSON.parse(msg.data);
+      if (typeof e.seq === "number") lastSeq = e.seq;
+      onEvent(e);
     } catch {
       // ignore
     }
@@ -45,6 +45,9 @@ export default function ChatPage() {
   useEffect(() => {
     try {
       const ws = connectWs((e: WsEvent) => {
+        if (e.type === "resync") {
+          listMessages(convId).then(setMessages).catch(() => undefined);
+        }
         if (e.type === "message:new" && e.conversation_id === convId) {
           setMessages((prev) => (prev.some((m) => m.id === e.message.id) ? prev : [...prev, e.message]));
         }
@@ -64,6 +67,16 @@ export default function ChatPage() {
             return Array.from(set);
           });
         }
+        if (e.type === "presence:snapshot") {
+          setOnlineUserIds((prev) => {
+            const set = new Set(prev);
+            for (const u of e.users as { user_id: number; online: boolean }[]) {
+              if (u.online) set.add(u.user_id);
+              else set.delete(u.user_id);
+            }
+            return Array.from(set);
+          });
+        }
       });
       wsRef.current = ws;
       return () => {